@@ -0,0 +1,67 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+class AddIndexOnline(AddIndexConcurrently):
+    """
+    Builds the index with CREATE INDEX CONCURRENTLY on PostgreSQL so large tables stay
+    writable while it is built. Other databases get a regular CREATE INDEX.
+    Migrations using it must set ``atomic = False``.
+    """
+
+    def describe(self):
+        return "Online create index %s on %s" % (self.index.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class AddPostgresIndexOnline(AddIndexConcurrently):
+    """
+    Concurrent index build for PostgreSQL-only index types (GIN, trigram operator classes).
+    The index is skipped on other databases, which serve the same queries without it.
+    """
+
+    def describe(self):
+        return "Online create PostgreSQL index %s on %s" % (self.index.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddUniqueConstraintOnline(AddConstraint):
+    """
+    Adds a partial ``UniqueConstraint`` (stored as a unique index) with CREATE UNIQUE INDEX
+    CONCURRENTLY on PostgreSQL, so the table stays writable while it is built. Other databases
+    get the regular statement. Migrations using it must set ``atomic = False``.
+    """
+
+    def describe(self):
+        return "Online create unique constraint %s on model %s" % (self.constraint.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if schema_editor.connection.vendor != "postgresql" or self.constraint.condition is None:
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            sql = str(self.constraint.create_sql(model, schema_editor))
+            schema_editor.execute(sql.replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if schema_editor.connection.vendor != "postgresql" or self.constraint.condition is None:
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % schema_editor.quote_name(self.constraint.name))
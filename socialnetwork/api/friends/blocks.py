@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.db import transaction
+from api.models import BlockedUser
+from socialnetwork.cache import (
+    get_block_generation, aget_block_generation, bump_block_generation,
+)
+
+BLOCK_SETS_KEY = "blocks:%s:%s"  # User id, block generation -> (blocked ids, blocked-by ids)
+BLOCK_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _load_block_sets(user_id):
+    return (
+        frozenset(BlockedUser.objects.filter(blocked_by_id=user_id).values_list('blocked_user_id', flat=True)),
+        frozenset(BlockedUser.objects.filter(blocked_user_id=user_id).values_list('blocked_by_id', flat=True)),
+    )
+
+
+def get_block_sets(user_id):
+    """
+    Returns ``(blocked_ids, blocked_by_ids)`` for a user as frozensets, cached under the user's
+    block generation. ``block_changed`` moves the generation once a block commits, so a reader
+    that loaded the sets before the commit can only store them under a key nobody reads anymore.
+    """
+    key = BLOCK_SETS_KEY % (user_id, get_block_generation(user_id))
+    block_sets = cache.get(key)
+    if block_sets is None:
+        block_sets = _load_block_sets(user_id)
+        cache.set(key, block_sets, BLOCK_CACHE_TIMEOUT)
+    return block_sets
+
+
+async def aget_block_sets(user_id):
+    """ Async version of ``get_block_sets`` for the ASGI views """
+    key = BLOCK_SETS_KEY % (user_id, await aget_block_generation(user_id))
+    block_sets = await cache.aget(key)
+    if block_sets is None:
+        block_sets = (
+            frozenset([
+                blocked_id async for blocked_id in
+                BlockedUser.objects.filter(blocked_by_id=user_id).values_list('blocked_user_id', flat=True)
+            ]),
+            frozenset([
+                blocked_by_id async for blocked_by_id in
+                BlockedUser.objects.filter(blocked_user_id=user_id).values_list('blocked_by_id', flat=True)
+            ]),
+        )
+        await cache.aset(key, block_sets, BLOCK_CACHE_TIMEOUT)
+    return block_sets
+
+
+def get_blocked_ids(user_id):
+    return get_block_sets(user_id)[0]
+
+
+def get_blocked_by_ids(user_id):
+    return get_block_sets(user_id)[1]
+
+
+def is_blocked_either_way(user_id, other_id):
+    """ True when either user has blocked the other """
+    blocked, blocked_by = get_block_sets(user_id)
+    other_id = int(other_id)
+    return other_id in blocked or other_id in blocked_by
+
+
+def block_changed(blocked_by_id, blocked_user_id):
+    """ Moves both users to a new block generation once the change is committed """
+    transaction.on_commit(lambda: bump_block_generation(blocked_by_id, blocked_user_id))
@@ -0,0 +1,93 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, F
+from api.models import UserCounters, UserMaster, Friendship, FriendRequest
+
+COUNTER_FIELDS = ('friend_count', 'pending_in_count')
+
+
+def count_from_source(user_ids):
+    """ Recounts the counters of the existing users in ``user_ids`` from the friendship and friend request tables """
+    user_ids = list(UserMaster.objects.filter(id__in=list(user_ids)).values_list('id', flat=True))
+    counts = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    friends = Friendship.objects.filter(user_id__in=user_ids).values('user_id').annotate(total=Count('id'))
+    for row in friends.order_by():
+        counts[row['user_id']]['friend_count'] = row['total']
+    pending = FriendRequest.objects.filter(sent_to_id__in=user_ids, status="pending").values('sent_to_id').annotate(total=Count('id'))
+    for row in pending.order_by():
+        counts[row['sent_to_id']]['pending_in_count'] = row['total']
+    return counts
+
+
+def reconcile_counters(user_ids):
+    """
+    Rewrites the counter rows of ``user_ids`` that differ from a recount, creating missing rows.
+    Returns the ids of the users whose row was written.
+    """
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        # Locking the rows first makes concurrent adjust_counters() calls wait for the rewrite
+        stored = {
+            row['user_id']: row for row in
+            UserCounters.objects.select_for_update().filter(user_id__in=user_ids).values('user_id', *COUNTER_FIELDS)
+        }
+        counts = count_from_source(user_ids)
+        repaired = [
+            UserCounters(user_id=user_id, **values) for user_id, values in counts.items()
+            if user_id not in stored or any(stored[user_id][field] != values[field] for field in COUNTER_FIELDS)
+        ]
+        UserCounters.objects.bulk_create(
+            repaired, update_conflicts=True, unique_fields=['user'], update_fields=list(COUNTER_FIELDS),
+        )
+    return [row.user_id for row in repaired]
+
+
+def adjust_counters(field, deltas):
+    """
+    Applies ``{user_id: delta}`` to one counter with ``field = field + delta`` UPDATEs, one per
+    distinct delta. Call it inside the transaction of the write that changed the counts.
+    Users without a counter row yet get one from a recount, which already includes the write.
+    """
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        updated = UserCounters.objects.filter(user_id__in=user_ids).update(**{field: F(field) + delta})
+        if updated < len(user_ids):
+            existing = set(UserCounters.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+            reconcile_counters([user_id for user_id in user_ids if user_id not in existing])
+
+
+def tally(user_ids, sign=1):
+    """ ``{user_id: sign * occurrences}`` for ``adjust_counters`` """
+    deltas = {}
+    for user_id in user_ids:
+        deltas[user_id] = deltas.get(user_id, 0) + sign
+    return deltas
+
+
+def get_counts(user_id):
+    """ ``{'friend_count': ..., 'pending_in_count': ...}`` for a user, from the counter row """
+    counts = UserCounters.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+    if counts is None:
+        reconcile_counters([user_id])
+        counts = UserCounters.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+    return counts
+
+
+async def aget_counts(user_id):
+    """ Async version of ``get_counts`` for the ASGI views """
+    counts = await UserCounters.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).afirst()
+    if counts is None:
+        await sync_to_async(reconcile_counters)([user_id])
+        counts = await UserCounters.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).afirst()
+    return counts
+
+
+def get_count(user_id, field):
+    return get_counts(user_id)[field]
+
+
+async def aget_count(user_id, field):
+    return (await aget_counts(user_id))[field]
@@ -0,0 +1,89 @@
+import logging
+import orjson
+from django.db.models import F
+from api.models import UserMaster, FriendRequest, Friendship, BlockedUser
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per database round trip and written per chunk of the response
+EXPORT_CHUNK_SIZE = 2000
+
+# (record type, queryset builder, ((output key, lookup), ...)) of a user's export
+USER_EXPORT = (
+    ("friend", lambda user_id: Friendship.objects.filter(user_id=user_id), (
+        ("friend_id", "friend_id"), ("name", "friend__name"), ("email", "friend__email"), ("since", "since"),
+    )),
+    ("pending_received", lambda user_id: FriendRequest.objects.filter(sent_to_id=user_id, status="pending"), (
+        ("id", "id"), ("sent_by_id", "sent_by_id"), ("name", "sent_by__name"), ("email", "sent_by__email"),
+        ("created_on", "created_on"),
+    )),
+    ("pending_sent", lambda user_id: FriendRequest.objects.filter(sent_by_id=user_id, status="pending"), (
+        ("id", "id"), ("sent_to_id", "sent_to_id"), ("name", "sent_to__name"), ("email", "sent_to__email"),
+        ("created_on", "created_on"),
+    )),
+    ("blocked", lambda user_id: BlockedUser.objects.filter(blocked_by_id=user_id), (
+        ("user_id", "blocked_user_id"), ("blocked_on", "blocked_on"),
+    )),
+)
+
+# Same for the whole graph; every friendship is written once, from its lower user id
+GRAPH_EXPORT = (
+    ("user", lambda: UserMaster.objects.all(), (
+        ("id", "id"), ("name", "name"), ("email", "email"), ("role", "role"), ("created_on", "created_on"),
+    )),
+    ("friendship", lambda: Friendship.objects.filter(user_id__lt=F("friend_id")), (
+        ("user_id", "user_id"), ("friend_id", "friend_id"), ("since", "since"),
+    )),
+    ("friend_request", lambda: FriendRequest.objects.all(), (
+        ("id", "id"), ("sent_by_id", "sent_by_id"), ("sent_to_id", "sent_to_id"), ("status", "status"),
+        ("created_on", "created_on"), ("updated_on", "updated_on"),
+    )),
+    ("block", lambda: BlockedUser.objects.all(), (
+        ("blocked_by_id", "blocked_by_id"), ("blocked_user_id", "blocked_user_id"), ("blocked_on", "blocked_on"),
+    )),
+)
+
+
+def ndjson_records(record_type, queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the rows of ``queryset`` as NDJSON, one bytes chunk per ``chunk_size`` rows.
+    Rows are read with ``.iterator()`` (a server-side cursor on PostgreSQL), so at most one
+    chunk of rows and one chunk of encoded lines are held at a time.
+    """
+    keys = [key for key, _ in fields]
+    rows = queryset.order_by('pk').values_list(*[lookup for _, lookup in fields]).iterator(chunk_size=chunk_size)
+    lines = []
+    for row in rows:
+        record = {"type": record_type}
+        record.update(zip(keys, row))
+        lines.append(orjson.dumps(record, option=orjson.OPT_UTC_Z))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def export_user_graph(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """ NDJSON chunks of a user's friends, pending requests (both directions) and blocks """
+    for record_type, queryset, fields in USER_EXPORT:
+        yield from ndjson_records(record_type, queryset(user_id), fields, chunk_size)
+
+
+def export_graph(chunk_size=EXPORT_CHUNK_SIZE):
+    """ NDJSON chunks of every user, friendship, friend request and block """
+    for record_type, queryset, fields in GRAPH_EXPORT:
+        yield from ndjson_records(record_type, queryset(), fields, chunk_size)
+
+
+def ndjson_response_chunks(chunks):
+    """
+    ``chunks`` for a StreamingHttpResponse. The status line is long gone when a query fails
+    mid-export, so the error is logged and the stream ends with an ``{"type": "error"}`` record;
+    a download without one is complete.
+    """
+    try:
+        yield from chunks
+    except Exception as e:
+        logger.exception("NDJSON export failed")
+        yield orjson.dumps({"type": "error", "error": str(e)}) + b"\n"
@@ -0,0 +1,129 @@
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from api.models import UserMaster, Friendship
+from api.friends.blocks import get_block_sets
+from socialnetwork.cache import GENERATION_KEY, get_generations, record_cache_event
+
+CONNECTION_KEY = "connection_entry:%s:%s:%s:%s"  # Lower user id, higher user id and their generations
+
+
+def find_path(source_id, target_id, max_depth=3, max_frontier=10_000, max_edges=20_000, excluded=frozenset()):
+    """
+    Shortest friendship path from ``source_id`` to ``target_id`` with a bidirectional BFS.
+    Each hop expands the smaller of the two frontiers with one ``user_id IN (...) LIMIT`` query,
+    so a path of length n costs at most n queries and loads at most ``max_edges`` friendship rows
+    per hop, however popular the users along the way. Users in ``excluded`` are never part of the path.
+    Returns ``(path, truncated)``: the user ids from source to target (None when there is no
+    path within ``max_depth``) and whether the search stopped because a frontier had more than
+    ``max_frontier`` users or ``max_edges`` friendships.
+    """
+    if source_id == target_id:
+        return [source_id], False
+    if source_id in excluded or target_id in excluded:
+        return None, False
+
+    # user id -> (parent on the way back to the side's start, distance from it)
+    visited = ({source_id: (None, 0)}, {target_id: (None, 0)})
+    frontiers = ([source_id], [target_id])
+    depths = [0, 0]
+    while depths[0] + depths[1] < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        frontier, mine, theirs = frontiers[side], visited[side], visited[1 - side]
+        if not frontier:
+            return None, False
+        if len(frontier) > max_frontier:
+            return None, True
+
+        edges = list(Friendship.objects.filter(user_id__in=frontier).values_list('user_id', 'friend_id')[:max_edges + 1])
+        if len(edges) > max_edges:
+            return None, True
+
+        depths[side] += 1
+        next_frontier, meet = [], None
+        for user_id, friend_id in edges:
+            if friend_id in mine or friend_id in excluded:
+                continue
+            mine[friend_id] = (user_id, depths[side])
+            next_frontier.append(friend_id)
+            # Of the users both sides reached in this hop, keep the one closest to the other side
+            if friend_id in theirs and (meet is None or theirs[friend_id][1] < theirs[meet][1]):
+                meet = friend_id
+        if meet is not None:
+            path = _walk(visited[0], meet)[::-1] + _walk(visited[1], meet)[1:]
+            return path, False
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+    return None, False
+
+
+def _walk(visited, user_id):
+    """ ``user_id`` followed by its parents up to the start of the search side """
+    path = []
+    while user_id is not None:
+        path.append(user_id)
+        user_id = visited[user_id][0]
+    return path
+
+
+def get_connection(user_id, other_id):
+    """
+    How ``user_id`` is connected to ``other_id``: ``{"degree": 1, 2, 3... or None, "path": [{id, name}, ...],
+    "truncated": bool}``. Users either of them blocked or was blocked by are left out of the path.
+    Results are cached per pair until either user's generation moves, which every friendship or block
+    change of theirs does; changes further away in the graph show up once CONNECTION_CACHE_TIMEOUT passes.
+    """
+    connection, _ = _connection_entry(user_id, other_id)
+
+    # Cached from the lower id's point of view
+    if int(user_id) > int(other_id):
+        connection = dict(connection, path=connection["path"][::-1])
+    return connection
+
+
+def get_connection_version(user_id, other_id):
+    """
+    When the connection of the pair now served by ``get_connection`` was computed. It moves with
+    every refill, including the one after CONNECTION_CACHE_TIMEOUT, so ETags built from it stop
+    matching once changes further away in the graph become visible.
+    """
+    return _connection_entry(user_id, other_id)[1]
+
+
+def _connection_entry(user_id, other_id):
+    """ ``(connection from the lower id's point of view, time it was computed)`` of a pair, from the cache """
+    low, high = sorted((int(user_id), int(other_id)))
+    key = CONNECTION_KEY % (low, high, *get_generations([GENERATION_KEY % low, GENERATION_KEY % high]))
+    entry = cache.get(key)
+    if entry is not None:
+        record_cache_event("connection", "hit")
+        return entry
+
+    record_cache_event("connection", "miss")
+    excluded = frozenset().union(*get_block_sets(low), *get_block_sets(high))
+    path, truncated = find_path(
+        low, high,
+        max_depth=getattr(settings, "CONNECTION_MAX_DEPTH", 3),
+        max_frontier=getattr(settings, "CONNECTION_MAX_FRONTIER", 10_000),
+        max_edges=getattr(settings, "CONNECTION_MAX_EDGES", 20_000),
+        excluded=excluded,
+    )
+    names = dict(UserMaster.objects.filter(id__in=path).values_list('id', 'name')) if path else {}
+    connection = {
+        "degree": len(path) - 1 if path else None,
+        "path": [{"id": path_user_id, "name": names.get(path_user_id)} for path_user_id in path or ()],
+        "truncated": truncated,
+    }
+    entry = (connection, time.time())
+    cache.set(key, entry, getattr(settings, "CONNECTION_CACHE_TIMEOUT", 5 * 60))
+    return entry
+
+
+async def aget_connection(user_id, other_id):
+    """ ``get_connection`` for the ASGI views; the search itself runs on the sync ORM """
+    return await sync_to_async(get_connection)(user_id, other_id)
+
+
+async def aget_connection_version(user_id, other_id):
+    """ ``get_connection_version`` for the ASGI views """
+    return await sync_to_async(get_connection_version)(user_id, other_id)
@@ -1,14 +1,15 @@
 from rest_framework import serializers
-import datetime
-from api.models import FriendRequest, BlockedUser,UserMaster,FriendRequest
-
-class SendFriendRequestsSerializer(serializers.ModelSerializer):
+from django.db import transaction
+from api.models import FriendRequest, BlockedUser,UserMaster,FriendRequest, Friendship, FriendSuggestion
+from api.friends.services import remove_friendship, BULK_LIMIT
+from api.friends.blocks import get_block_sets, get_blocked_ids
+from api.friends.counters import get_counts
+from api.friends.paths import get_connection
+from socialnetwork.projections import ProjectionSerializer
+
+class SendFriendRequestsSerializer(serializers.Serializer):
     sent_to = serializers.IntegerField(required=True)
 
-    class Meta:
-        model = FriendRequest
-        fields = ['sent_to']
-
     def validate(self, attrs):
         sender = self.context.get("user")
         sent_to = attrs.get('sent_to')
@@ -17,35 +18,15 @@ class SendFriendRequestsSerializer(serializers.ModelSerializer):
         if sent_to == sender.id:
             raise serializers.ValidationError({'error': "You cannot send a request to yourself!"})
 
-        # Restrict user if request already sent and pending
-        if FriendRequest.objects.filter(sent_to=sent_to, sent_by=sender, status="pending").exists():
-            raise serializers.ValidationError({'error': "Friend Request already pending for selected user"})
-
-        # Check if the recipient has sent a request to the sender
-        if FriendRequest.objects.filter(sent_to=sender, sent_by_id=sent_to, status="pending").exists():
-            raise serializers.ValidationError({'error': "Please accept/reject the pending request for this user"})
-
-        # Apply limit on the number of requests to be sent in one minute
-        time_limit = datetime.datetime.now() - datetime.timedelta(minutes=1)
-        if FriendRequest.objects.filter(sent_by=sender, created_on__gte=time_limit).count() >= 3:
-            raise serializers.ValidationError({'error': "You can only send up to 3 requests in one minute"})
-
-        # Check if the recipient is blocked by the sender
-        blocked_users = BlockedUser.objects.filter(blocked_by=sender).values_list('blocked_user_id', flat=True)
-        if sent_to in blocked_users:
-            raise serializers.ValidationError("You cannot send a friend request to a blocked user.")
-
-        # Check if the sender is blocked by the recipient
-        if BlockedUser.objects.filter(blocked_by=sent_to, blocked_user=sender).exists():
-            raise serializers.ValidationError("You cannot send a friend request to a user who has blocked you.")
-
+        # Every other rule is enforced by the guarded insert in api.friends.services.send_request
         return attrs
 
-    def create(self, validated_data):
-        sent_to = validated_data.get("sent_to")
-        sender = self.context.get('user')
-        FriendRequest.objects.create(sent_to_id=sent_to, sent_by=sender, status="pending")
-        return validated_data
+
+class BulkFriendRequestsSerializer(serializers.Serializer):
+    """ List of user IDs (send) or friend request IDs (accept/reject) for the bulk endpoints """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_LIMIT
+    )
 
 
 class ViewPendingRequestsSerializer(serializers.ModelSerializer):
@@ -67,55 +48,96 @@ class ViewPendingRequestsSerializer(serializers.ModelSerializer):
         return obj.created_on.strftime("%d-%m-%Y %I:%M:%S %p")
 
 
-class AcceptFriendRequestsSerializer(serializers.Serializer):
-    def validate(self, attrs):
-        user = self.context.get("user")
-        request_instance = self.instance
-        if request_instance.sent_to != user:
-            raise serializers.ValidationError({'error': "You cannot update the requests for other users"})
-        if request_instance.status == "accepted":
-            raise serializers.ValidationError({'error': "Request already accepted!"})
-        return attrs
-
-    def update(self, instance, validated_data):
-        instance.status = "accepted"
-        instance.save()
-        return validated_data
+class PendingRequestsProjection(ProjectionSerializer):
+    """ Same output as ViewPendingRequestsSerializer, built from ``.values()`` rows """
+    fields = (
+        ('id', 'id'),
+        ('sent_by_id', 'sent_by_id'),
+        ('sender_name', 'sent_by__name'),
+        ('sender_email', 'sent_by__email'),
+        ('sent_on', 'created_on'),
+    )
+    timestamp_fields = ('created_on',)
 
 
 class ViewFriendsSerializer(serializers.ModelSerializer):
+    sent_by_id = serializers.IntegerField(source='friend_id')
     sender_name = serializers.SerializerMethodField()
     sender_email = serializers.SerializerMethodField()
     friends_since = serializers.SerializerMethodField()
 
     class Meta:
-        model = FriendRequest
+        model = Friendship
         fields = ['id', 'sent_by_id', "sender_name", "sender_email", 'friends_since']
 
     def get_sender_name(self, obj):
-        return obj.sent_by.name
+        return obj.friend.name
 
     def get_sender_email(self, obj):
-        return obj.sent_by.email
+        return obj.friend.email
 
     def get_friends_since(self, obj):
-        return obj.updated_on.strftime("%d-%m-%Y %I:%M:%S %p")
+        return obj.since.strftime("%d-%m-%Y %I:%M:%S %p")
+
+
+class FriendsProjection(ProjectionSerializer):
+    """ Same output as ViewFriendsSerializer, built from ``.values()`` rows """
+    fields = (
+        ('id', 'id'),
+        ('sent_by_id', 'friend_id'),
+        ('sender_name', 'friend__name'),
+        ('sender_email', 'friend__email'),
+        ('friends_since', 'since'),
+    )
+    timestamp_fields = ('since',)
+
+class FriendSuggestionsSerializer(serializers.ModelSerializer):
+    name = serializers.SerializerMethodField()
+    email = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ['id', 'suggested_user_id', 'name', 'email', 'mutual_friends']
+
+    def get_name(self, obj):
+        return obj.suggested_user.name
+
+    def get_email(self, obj):
+        return obj.suggested_user.email
+
 
 class UserProfileSerializer(serializers.ModelSerializer):
     is_blocked = serializers.SerializerMethodField()
     blocked_by_user = serializers.SerializerMethodField()
+    friend_count = serializers.SerializerMethodField()
+    connection = serializers.SerializerMethodField()
 
     class Meta:
         model = UserMaster
-        fields = ['id', 'username', 'email', 'profile_picture', 'is_blocked', 'blocked_by_user']
+        fields = ['id', 'name', 'email', 'is_blocked', 'blocked_by_user', 'friend_count', 'connection']
+
+    def _block_sets(self):
+        # Async views load the sets beforehand and pass them in the context
+        if 'block_sets' not in self.context:
+            self.context['block_sets'] = get_block_sets(self.context['request'].user.id)
+        return self.context['block_sets']
 
     def get_is_blocked(self, obj):
-        user = self.context['request'].user
-        return BlockedUser.objects.filter(blocked_by=user, blocked_user=obj).exists()
+        return obj.id in self._block_sets()[0]
 
     def get_blocked_by_user(self, obj):
-        user = self.context['request'].user
-        return BlockedUser.objects.filter(blocked_by=obj, blocked_user=user).exists()
+        return obj.id in self._block_sets()[1]
+
+    def get_friend_count(self, obj):
+        # Read from the UserCounters row; views pass it in the context
+        counts = self.context.get('counts') or get_counts(obj.id)
+        return counts['friend_count']
+
+    def get_connection(self, obj):
+        # Degree of separation from the viewer and one shortest path; async views pass it in the context
+        if 'connection' in self.context:
+            return self.context['connection']
+        return get_connection(self.context['request'].user.id, obj.id)
 
 
 class BlockUserSerializer(serializers.ModelSerializer):
@@ -126,16 +148,19 @@ class BlockUserSerializer(serializers.ModelSerializer):
     def validate_blocked_user(self, value):
         """Prevent users from blocking themselves or blocking already blocked users."""
         user = self.context['user']
-        if user.id == value:
+        if user.id == value.id:
             raise serializers.ValidationError("You cannot block yourself.")
-        if BlockedUser.objects.filter(blocked_by=user, blocked_user=value).exists():
+        if value.id in get_blocked_ids(user.id):
             raise serializers.ValidationError("This user is already blocked.")
         return value
 
     def create(self, validated_data):
         blocked_by = self.context['user']
         blocked_user = validated_data['blocked_user']
-        block_instance, created = BlockedUser.objects.get_or_create(blocked_by=blocked_by, blocked_user=blocked_user)
+        with transaction.atomic():
+            block_instance, created = BlockedUser.objects.get_or_create(blocked_by=blocked_by, blocked_user=blocked_user)
+            # Blocking a user ends the friendship
+            remove_friendship(blocked_by.id, blocked_user.id)
         return block_instance
 
 
@@ -145,6 +170,17 @@ class UnblockUserSerializer(serializers.Serializer):
     def validate_blocked_user_id(self, value):
         """Check if the user is actually blocked."""
         user = self.context['user']
-        if not BlockedUser.objects.filter(blocked_by=user, blocked_user_id=value).exists():
+        if value not in get_blocked_ids(user.id):
             raise serializers.ValidationError("User is not blocked.")
         return value
+
+
+class UnfriendUserSerializer(serializers.Serializer):
+    friend_id = serializers.IntegerField()
+
+    def validate_friend_id(self, value):
+        """Check if the users are actually friends."""
+        user = self.context['user']
+        if not Friendship.objects.filter(user=user, friend_id=value).exists():
+            raise serializers.ValidationError("User is not in your friend list.")
+        return value
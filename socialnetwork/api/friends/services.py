@@ -0,0 +1,372 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from api.models import FriendRequest, FriendRequestArchive, Friendship, UserMaster, BlockedUser
+from api.friends.blocks import get_block_sets
+from api.friends.counters import adjust_counters, tally
+
+# Largest number of items accepted by one bulk call
+BULK_LIMIT = 100
+
+# Why a friend request could not be sent, by error code
+SEND_ERRORS = {
+    "self": "You cannot send a request to yourself!",
+    "invalid": "Invalid ID",
+    "blocked": "You cannot send a friend request to a blocked user.",
+    "blocked_by": "You cannot send a friend request to a user who has blocked you.",
+    "pending": "Friend Request already pending for selected user",
+    "reverse_pending": "Please accept/reject the pending request for this user",
+    "rate_limited": "You can only send up to 3 requests in one minute",
+}
+
+
+def add_friendship(user_id, friend_id, since=None):
+    """ Stores both directions of an accepted friendship edge """
+    add_friendships([(user_id, friend_id)], since=since)
+
+
+def add_friendships(pairs, since=None):
+    """
+    Stores both directions of several accepted friendship edges in one
+    ``INSERT ... ON CONFLICT DO NOTHING RETURNING``, and counts only the edges that were new.
+    """
+    edges = [edge for user_id, friend_id in pairs for edge in ((user_id, friend_id), (friend_id, user_id))]
+    if not edges:
+        return
+    since = connection.ops.adapt_datetimefield_value(since or timezone.now())
+    opts = Friendship._meta
+    qn = connection.ops.quote_name
+    user, friend = qn(opts.get_field("user").column), qn(opts.get_field("friend").column)
+    sql = "INSERT INTO %s (%s, %s, %s) VALUES %s ON CONFLICT DO NOTHING RETURNING %s" % (
+        qn(opts.db_table), user, friend, qn(opts.get_field("since").column),
+        ", ".join(["(%s, %s, %s)"] * len(edges)), user,
+    )
+    params = [value for user_id, friend_id in edges for value in (user_id, friend_id, since)]
+    with transaction.atomic(savepoint=False):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            added = [row[0] for row in cursor.fetchall()]
+        adjust_counters("friend_count", tally(added))
+
+
+def remove_friendship(user_id, friend_id):
+    """ Removes both friendship edges and the accepted requests that created them """
+    with transaction.atomic():
+        removed, _ = Friendship.objects.filter(user_id=user_id, friend_id=friend_id).delete()
+        removed_back, _ = Friendship.objects.filter(user_id=friend_id, friend_id=user_id).delete()
+        FriendRequest.objects.filter(sent_by_id=user_id, sent_to_id=friend_id, status="accepted").delete()
+        FriendRequest.objects.filter(sent_by_id=friend_id, sent_to_id=user_id, status="accepted").delete()
+        adjust_counters("friend_count", {user_id: -removed, friend_id: -removed_back})
+    return removed > 0
+
+
+def _result(item_id, message=None):
+    return {"id": item_id, "success": message is None, "message": message or ""}
+
+
+def _unique(ids):
+    return list(dict.fromkeys(ids))
+
+
+def _guarded_insert(sender_id, recipient_id, now):
+    """
+    ``INSERT ... SELECT ... WHERE <recipient exists, no block either way, no reverse pending request>
+    ON CONFLICT DO NOTHING RETURNING id``. A pending request in the same direction is a conflict
+    on the fr_unique_pending partial index, so two concurrent sends cannot both insert.
+    Returns the new request id, or None when nothing was inserted.
+    """
+    qn = connection.ops.quote_name
+    requests, users, blocks = FriendRequest._meta, UserMaster._meta, BlockedUser._meta
+    sent_by, sent_to, status = (qn(requests.get_field(name).column) for name in ("sent_by", "sent_to", "status"))
+    blocked_by, blocked_user = (qn(blocks.get_field(name).column) for name in ("blocked_by", "blocked_user"))
+
+    # The conflict target repeats the index predicate with a literal so PostgreSQL can infer the partial index
+    sql = (
+        "INSERT INTO {requests} ({sent_by}, {sent_to}, {status}, {created_on}, {updated_on}) "
+        "SELECT %s, %s, %s, %s, %s "
+        "WHERE EXISTS (SELECT 1 FROM {users} WHERE {user_pk} = %s) "
+        "AND NOT EXISTS (SELECT 1 FROM {blocks} WHERE ({blocked_by} = %s AND {blocked_user} = %s) "
+        "OR ({blocked_by} = %s AND {blocked_user} = %s)) "
+        "AND NOT EXISTS (SELECT 1 FROM {requests} WHERE {sent_by} = %s AND {sent_to} = %s AND {status} = %s) "
+        "ON CONFLICT ({sent_by}, {sent_to}) WHERE {status} = 'pending' DO NOTHING "
+        "RETURNING {request_pk}"
+    ).format(
+        requests=qn(requests.db_table), users=qn(users.db_table), blocks=qn(blocks.db_table),
+        sent_by=sent_by, sent_to=sent_to, status=status, blocked_by=blocked_by, blocked_user=blocked_user,
+        created_on=qn(requests.get_field("created_on").column), updated_on=qn(requests.get_field("updated_on").column),
+        user_pk=qn(users.pk.column), request_pk=qn(requests.pk.column),
+    )
+    now = connection.ops.adapt_datetimefield_value(now)
+    params = [
+        sender_id, recipient_id, "pending", now, now,
+        recipient_id,
+        sender_id, recipient_id, recipient_id, sender_id,
+        recipient_id, sender_id, "pending",
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _insert_pending(sender_id, recipient_ids, now):
+    """
+    ``INSERT ... VALUES ... ON CONFLICT DO NOTHING RETURNING sent_to`` of pending requests from
+    ``sender_id``. Requests that conflict on fr_unique_pending, i.e. were sent concurrently, are
+    skipped. Returns the recipients whose request was actually inserted.
+    """
+    if not recipient_ids:
+        return set()
+    opts = FriendRequest._meta
+    qn = connection.ops.quote_name
+    columns = [qn(opts.get_field(name).column) for name in ("sent_by", "sent_to", "status", "created_on", "updated_on")]
+    sql = "INSERT INTO %s (%s) VALUES %s ON CONFLICT DO NOTHING RETURNING %s" % (
+        qn(opts.db_table), ", ".join(columns), ", ".join(["(%s, %s, %s, %s, %s)"] * len(recipient_ids)), columns[1],
+    )
+    now = connection.ops.adapt_datetimefield_value(now)
+    params = [value for recipient_id in recipient_ids for value in (sender_id, recipient_id, "pending", now, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _explain_send_failure(sender_id, recipient_id):
+    """ Error code of a send that inserted nothing, from one query; only runs on failure """
+    pending = FriendRequest.objects.filter(status="pending")
+    blocks = BlockedUser.objects.all()
+    checks = {
+        "blocked": Exists(blocks.filter(blocked_by_id=sender_id, blocked_user=OuterRef('pk'))),
+        "blocked_by": Exists(blocks.filter(blocked_by=OuterRef('pk'), blocked_user_id=sender_id)),
+        "pending": Exists(pending.filter(sent_by_id=sender_id, sent_to=OuterRef('pk'))),
+        "reverse_pending": Exists(pending.filter(sent_by=OuterRef('pk'), sent_to_id=sender_id)),
+    }
+    # Annotation names are prefixed, "blocked_by" is also a reverse relation of UserMaster
+    row = UserMaster.objects.filter(pk=recipient_id).annotate(
+        **{"check_" + error: check for error, check in checks.items()}
+    ).values_list(*["check_" + error for error in checks]).first()
+    if row is None:
+        return "invalid"
+    for error, failed in zip(checks, row):
+        if failed:
+            return error
+    # The conflicting request was answered between the two queries
+    return "pending"
+
+
+def send_request(sender_id, recipient_id):
+    """
+    Sends one friend request with a single guarded INSERT, followed by the recipient's counter
+    UPDATE on success or by one query explaining a failure. Returns ``(request_id, None)`` or ``(None, error code)``, see ``SEND_ERRORS``.
+    """
+    if recipient_id == sender_id:
+        return None, "self"
+    request_id = _guarded_insert(sender_id, recipient_id, timezone.now())
+    if request_id is not None:
+        # Autocommitted right after the insert rather than in a transaction with it, which would
+        # add BEGIN/COMMIT round trips; reconcile_counters repairs the count if this never runs
+        adjust_counters("pending_in_count", {recipient_id: 1})
+        return request_id, None
+    return None, _explain_send_failure(sender_id, recipient_id)
+
+
+def bulk_send_requests(sender, recipient_ids, allow=None):
+    """
+    Sends friend requests to many users. Every rule of the single send path is checked for the
+    whole set at once. ``allow`` is called once per valid recipient and returns False when the
+    sender's rate limit is used up.
+    Returns one result per recipient, in request order, and the recipients whose request was inserted.
+    """
+    recipient_ids = _unique(recipient_ids)
+    blocked_users, blocked_by_users = get_block_sets(sender.id)
+    existing = set(UserMaster.objects.filter(id__in=recipient_ids).values_list('id', flat=True))
+    already_sent = set(FriendRequest.objects.filter(
+        sent_by=sender, sent_to_id__in=recipient_ids, status="pending"
+    ).values_list('sent_to_id', flat=True))
+    received = set(FriendRequest.objects.filter(
+        sent_by_id__in=recipient_ids, sent_to=sender, status="pending"
+    ).values_list('sent_by_id', flat=True))
+
+    checks, to_create, rate_limited = [], [], False
+    for recipient_id in recipient_ids:
+        if recipient_id == sender.id:
+            error = "self"
+        elif recipient_id not in existing:
+            error = "invalid"
+        elif recipient_id in blocked_users:
+            error = "blocked"
+        elif recipient_id in blocked_by_users:
+            error = "blocked_by"
+        elif recipient_id in already_sent:
+            error = "pending"
+        elif recipient_id in received:
+            error = "reverse_pending"
+        elif rate_limited or (allow is not None and not allow()):
+            rate_limited = True
+            error = "rate_limited"
+        else:
+            error = None
+            to_create.append(recipient_id)
+        checks.append((recipient_id, error))
+
+    with transaction.atomic():
+        inserted = _insert_pending(sender.id, to_create, timezone.now())
+        adjust_counters("pending_in_count", tally(inserted))
+
+    # A request sent concurrently to the same user was skipped by the fr_unique_pending constraint
+    results = [
+        _result(recipient_id, SEND_ERRORS.get("pending" if error is None and recipient_id not in inserted else error))
+        for recipient_id, error in checks
+    ]
+    return results, [recipient_id for recipient_id in to_create if recipient_id in inserted]
+
+
+# Friend request state machine: every transition starts from "pending". Each action maps to
+# (new status, the user column that must match the acting user, message when it does not)
+TRANSITIONS = {
+    "accept": ("accepted", "sent_to", "You cannot update the requests for other users"),
+    "reject": ("rejected", "sent_to", "You cannot update the requests for other users"),
+    "cancel": ("cancelled", "sent_by", "You cannot cancel the requests of other users"),
+}
+
+
+def _conditional_update(request_ids, status, now, actor_field=None, actor_id=None):
+    """
+    ``UPDATE ... WHERE id IN (...) [AND <actor> = %s] AND status = 'pending' RETURNING ...``.
+    Rows that are no longer pending or belong to someone else are left alone, so concurrent
+    transitions of the same request cannot both succeed.
+    Returns ``{request_id: (sent_by_id, sent_to_id)}`` for the rows that changed.
+    """
+    if not request_ids:
+        return {}
+    opts = FriendRequest._meta
+    qn = connection.ops.quote_name
+    conditions = ["%s IN (%s)" % (qn(opts.pk.column), ", ".join(["%s"] * len(request_ids)))]
+    params = [status, now, *request_ids]
+    if actor_field is not None:
+        conditions.append("%s = %%s" % qn(opts.get_field(actor_field).column))
+        params.append(actor_id)
+    conditions.append("%s = %%s" % qn(opts.get_field("status").column))
+    params.append("pending")
+
+    sql = "UPDATE %s SET %s = %%s, %s = %%s WHERE %s RETURNING %s, %s, %s" % (
+        qn(opts.db_table), qn(opts.get_field("status").column), qn(opts.get_field("updated_on").column),
+        " AND ".join(conditions),
+        qn(opts.pk.column), qn(opts.get_field("sent_by").column), qn(opts.get_field("sent_to").column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def _explain_failures(request_ids, actor_field, actor_id, other_users_message):
+    """ Why a transition did not happen; only runs for the requests that failed """
+    rows = {
+        row[0]: row for row in FriendRequest.objects.filter(id__in=request_ids)
+        .values_list('id', actor_field + '_id', 'status')
+    }
+    errors = {}
+    for request_id in request_ids:
+        row = rows.get(request_id)
+        if row is None:
+            errors[request_id] = "Invalid ID"
+        elif row[1] != actor_id:
+            errors[request_id] = other_users_message
+        else:
+            errors[request_id] = "Request already %s!" % row[2]
+    return errors
+
+
+def transition_requests(user_id, request_ids, action):
+    """
+    Applies ``action`` ("accept", "reject" or "cancel") to pending requests of ``user_id`` with
+    one conditional UPDATE. Side effects (friendship edges on accept) only happen for the rows
+    that actually changed.
+    Returns ``(moved, errors)``: ``{request_id: (sent_by_id, sent_to_id)}`` and ``{request_id: message}``.
+    """
+    status, actor_field, other_users_message = TRANSITIONS[action]
+    request_ids = _unique(request_ids)
+    now = timezone.now()
+    with transaction.atomic():
+        moved = _conditional_update(request_ids, status, now, actor_field, user_id)
+        if moved:
+            adjust_counters("pending_in_count", tally((sent_to_id for _, sent_to_id in moved.values()), -1))
+        if action == "accept" and moved:
+            add_friendships(moved.values(), since=now)
+
+    failed = [request_id for request_id in request_ids if request_id not in moved]
+    errors = _explain_failures(failed, actor_field, user_id, other_users_message) if failed else {}
+    return moved, errors
+
+
+def transition_request(user_id, request_id, action):
+    """ Single request version of ``transition_requests``; returns ``((sent_by_id, sent_to_id), None)`` or ``(None, message)`` """
+    moved, errors = transition_requests(user_id, [request_id], action)
+    if request_id in moved:
+        return moved[request_id], None
+    return None, errors[request_id]
+
+
+def expire_requests(created_before, batch_size=1000):
+    """
+    Moves requests that have been pending since before ``created_before`` to "expired", one
+    batch per conditional UPDATE. Yields ``{request_id: (sent_by_id, sent_to_id)}`` per batch.
+    """
+    pending = FriendRequest.objects.filter(status="pending", created_on__lt=created_before).order_by('id')
+    last_id = 0
+    while True:
+        request_ids = list(pending.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not request_ids:
+            return
+        last_id = request_ids[-1]
+        with transaction.atomic():
+            moved = _conditional_update(request_ids, "expired", timezone.now())
+            adjust_counters("pending_in_count", tally((sent_to_id for _, sent_to_id in moved.values()), -1))
+        yield moved
+
+
+ARCHIVE_FIELDS = ('id', 'sent_by_id', 'sent_to_id', 'status', 'created_on', 'updated_on')
+
+
+def archive_requests(answered_before, batch_size=1000, start_id=0):
+    """
+    Moves requests answered (any status but "pending") before ``answered_before`` into
+    FriendRequestArchive in id order, copying and deleting each batch in its own short
+    transaction. Answered rows never change again, so no row locks are taken, and an
+    interrupted run can be repeated or resumed from the last reported id.
+    Yields ``(last_id, rows moved)`` per batch.
+    """
+    answered = FriendRequest.objects.exclude(status="pending").filter(updated_on__lt=answered_before).order_by('id')
+    last_id = start_id
+    while True:
+        with transaction.atomic():
+            rows = list(answered.filter(id__gt=last_id).values(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                return
+            FriendRequestArchive.objects.bulk_create(
+                [FriendRequestArchive(**row) for row in rows], ignore_conflicts=True,
+            )
+            FriendRequest.objects.filter(id__in=[row['id'] for row in rows]).exclude(status="pending").delete()
+        last_id = rows[-1]['id']
+        yield last_id, len(rows)
+
+
+def bulk_accept_requests(user, request_ids):
+    """
+    Accepts many received friend requests with one conditional UPDATE and one friendship INSERT.
+    Returns the per-request results and the ids of the users that became friends.
+    """
+    request_ids = _unique(request_ids)
+    moved, errors = transition_requests(user.id, request_ids, "accept")
+    results = [_result(request_id, errors.get(request_id)) for request_id in request_ids]
+    return results, [moved[request_id][0] for request_id in request_ids if request_id in moved]
+
+
+def bulk_reject_requests(user, request_ids):
+    """
+    Rejects many received friend requests with one conditional UPDATE.
+    Returns the per-request results and the ids of the senders.
+    """
+    request_ids = _unique(request_ids)
+    moved, errors = transition_requests(user.id, request_ids, "reject")
+    results = [_result(request_id, errors.get(request_id)) for request_id in request_ids]
+    return results, [moved[request_id][0] for request_id in request_ids if request_id in moved]
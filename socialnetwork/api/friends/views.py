@@ -1,53 +1,106 @@
 from rest_framework_extensions.cache.mixins import CacheResponseMixin
-from rest_framework_extensions.cache.decorators import cache_response
+from socialnetwork.cache import (
+    cache_user_response, async_cache_user_response, bump_user_generation, conditional_user_response,
+    async_conditional_user_response,
+)
+from socialnetwork.pubsub import publish_event
+from socialnetwork.async_views import AsyncAPIView
+from socialnetwork.throttles import FriendRequestThrottle, ExportThrottle
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework.generics import RetrieveAPIView
 from api.permissions import IsAdmin, IsReadOnly, IsWrite, IsNotBlocked
-from api.models import FriendRequest, BlockedUser, UserMaster
-from socialnetwork.paginations import SocialNetworkPaginationClass
+from api.models import FriendRequest, BlockedUser, UserMaster, Friendship, FriendSuggestion
+from api.friends.services import (
+    remove_friendship, transition_request, send_request, bulk_send_requests, bulk_accept_requests,
+    bulk_reject_requests, SEND_ERRORS,
+)
+from api.friends.blocks import get_block_sets, aget_block_sets, is_blocked_either_way, block_changed
+from api.friends.counters import get_counts, aget_counts, get_count, aget_count
+from api.friends.paths import aget_connection, get_connection_version, aget_connection_version
+from api.friends.export import export_user_graph, export_graph, ndjson_response_chunks
+from rest_framework.exceptions import NotFound
+from socialnetwork.paginations import SocialNetworkCursorPaginationClass
 from api.friends.serializers import (
     SendFriendRequestsSerializer,
+    BulkFriendRequestsSerializer,
     ViewPendingRequestsSerializer,
-    AcceptFriendRequestsSerializer,
+    PendingRequestsProjection,
     ViewFriendsSerializer,
+    FriendsProjection,
+    FriendSuggestionsSerializer,
     BlockUserSerializer,
     UnblockUserSerializer,
+    UnfriendUserSerializer,
     UserProfileSerializer
 )
 from socialnetwork.responses import http_200_response, http_201_response, http_400_response, http_500_response
 
 
+def event_user(user):
+    # Who caused a pushed event; id and name come from the token claims, no query
+    return {'id': user.id, 'name': user.name}
+
+
 # View for Sending Friend Requests (No Cache)
 class SendFriendRequests(ModelViewSet):
     """ This View is Used to Send Friend Requests"""
     http_method_names = ['post']
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (FriendRequestThrottle,)  # Limit on the number of requests to be sent in one minute
+    throttle_message = "You can only send up to 3 requests in one minute"
     queryset = FriendRequest.objects.none()
     serializer_class = SendFriendRequestsSerializer
 
     def create(self, request, *args, **kwargs):
         try:
-            blocked_users = BlockedUser.objects.filter(blocked_by=request.user).values_list('blocked_user_id', flat=True)
-            recipient_id = request.data.get('sent_to')
-            
-            if recipient_id in blocked_users:
-                return http_400_response(message="You cannot send a friend request to a blocked user.")
-            
-            # Check if the recipient has blocked the user
-            if BlockedUser.objects.filter(blocked_by=recipient_id, blocked_user=request.user).exists():
-                return http_400_response(message="You cannot send a friend request to a user who has blocked you.")
-            
             serializer = self.serializer_class(data=request.data, context={'user': request.user})
-            if serializer.is_valid():
-                serializer.save()
+            if not serializer.is_valid():
+                return http_400_response(message=serializer.errors)
+
+            recipient_id = serializer.validated_data['sent_to']
+            request_id, error = send_request(request.user.id, recipient_id)
+            if error is None:
+                bump_user_generation(request.user.id, recipient_id)
+                publish_event([recipient_id], "friend_request.received", request_id=request_id, user=event_user(request.user))
                 return http_201_response(message="Friend Request Sent Successfully!")
-            else:
+            if error in ("pending", "reverse_pending"):
+                # Same shape as the serializer errors these checks used to raise
+                return http_400_response(message={'error': [SEND_ERRORS[error]]})
+            return http_400_response(message=SEND_ERRORS[error])
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# View for Sending Many Friend Requests at once (No Cache)
+class BulkSendFriendRequests(ModelViewSet):
+    """ This View is Used to Send Friend Requests to a list of users """
+    http_method_names = ['post']
+    permission_classes = (IsAuthenticated,)
+    queryset = FriendRequest.objects.none()
+    serializer_class = BulkFriendRequestsSerializer
+
+    def create(self, request, *args, **kwargs):
+        try:
+            serializer = self.serializer_class(data=request.data)
+            if not serializer.is_valid():
                 return http_400_response(message=serializer.errors)
+
+            # Each request that would be created takes one slot of the sender's rate limit
+            throttle = FriendRequestThrottle()
+            throttle_key = throttle.get_cache_key(request, self)
+            results, recipient_ids = bulk_send_requests(
+                request.user, serializer.validated_data['ids'], allow=lambda: throttle.consume(throttle_key)
+            )
+            bump_user_generation(request.user.id, *recipient_ids)
+            # bulk_create does not return the ids of the new requests
+            publish_event(recipient_ids, "friend_request.received", request_id=None, user=event_user(request.user))
+            return http_200_response(message="Friend Requests Processed Successfully!", data=results)
         except Exception as e:
             return http_500_response(error=str(e))
 
@@ -60,17 +113,23 @@ class ViewPendingRequests(CacheResponseMixin, ModelViewSet):
     queryset = FriendRequest.objects.none()
     serializer_class = ViewPendingRequestsSerializer
 
-    @cache_response()
+    @conditional_user_response()
+    @cache_user_response()
     def list(self, request, *args, **kwargs):
         try:
-            pending_requests = FriendRequest.objects.filter(
+            # Only the listed columns are selected and no model instances are built
+            pending_requests = PendingRequestsProjection.project(FriendRequest.objects.filter(
                 sent_to=request.user, status="pending"
-            ).select_related('sent_by').order_by("-created_on")
-            
-            serializer = self.serializer_class(pending_requests, many=True)
-            paginator = SocialNetworkPaginationClass()
-            page = paginator.paginate_queryset(serializer.data, request)
-            return paginator.get_paginated_response(page)
+            ))
+
+            paginator = SocialNetworkCursorPaginationClass(
+                ordering=('-created_on', '-id'), counter=lambda: get_count(request.user.id, 'pending_in_count')
+            )
+            page = paginator.paginate_queryset(pending_requests, request)
+            serializer = PendingRequestsProjection(page)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
         except Exception as e:
             return http_500_response(error=str(e))
 
@@ -85,6 +144,33 @@ class ViewPendingRequests(CacheResponseMixin, ModelViewSet):
             return http_500_response(error=str(e))
 
 
+# Async version of ViewPendingRequests, routed when ASYNC_READ_VIEWS is enabled
+class AsyncViewPendingRequests(AsyncAPIView):
+    """ This View is Used to View Pending Friend Requests under ASGI """
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated, IsReadOnly)
+
+    @async_conditional_user_response()
+    @async_cache_user_response()
+    async def get(self, request, *args, **kwargs):
+        try:
+            # Only the listed columns are selected and no model instances are built
+            pending_requests = PendingRequestsProjection.project(FriendRequest.objects.filter(
+                sent_to_id=request.user.id, status="pending"
+            ))
+
+            paginator = SocialNetworkCursorPaginationClass(
+                ordering=('-created_on', '-id'), counter=lambda: aget_count(request.user.id, 'pending_in_count')
+            )
+            page = await paginator.apaginate_queryset(pending_requests, request)
+            serializer = PendingRequestsProjection(page)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
 # View for Rejecting Friend Requests (No Cache)
 class RejectFriendRequests(ModelViewSet):
     """ This View is Used to Reject Friend Requests"""
@@ -94,14 +180,36 @@ class RejectFriendRequests(ModelViewSet):
 
     def destroy(self, request, pk, *args, **kwargs):
         try:
-            request_instance = FriendRequest.objects.select_related('sent_by', 'sent_to').get(id=int(pk))
-
-            if request_instance.sent_to != request.user:
-                return http_400_response(message="You cannot delete the requests for other users")
+            users, error = transition_request(request.user.id, int(pk), "reject")
+            if error:
+                return http_400_response(message=error)
 
-            request_instance.delete()
+            bump_user_generation(*users)
+            publish_event([users[0]], "friend_request.rejected", request_id=int(pk), user=event_user(request.user))
             return http_200_response(message="Friend Request Rejected Successfully!")
-        except FriendRequest.DoesNotExist:
+        except ValueError:
+            return http_400_response(message="Invalid ID")
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# View for Cancelling Sent Friend Requests (No Cache)
+class CancelFriendRequests(ModelViewSet):
+    """ This View is Used to Cancel Friend Requests sent by the user"""
+    http_method_names = ['delete']
+    permission_classes = (IsAuthenticated,)
+    queryset = FriendRequest.objects.none()
+
+    def destroy(self, request, pk, *args, **kwargs):
+        try:
+            users, error = transition_request(request.user.id, int(pk), "cancel")
+            if error:
+                return http_400_response(message=error)
+
+            bump_user_generation(*users)
+            publish_event([users[1]], "friend_request.cancelled", request_id=int(pk), user=event_user(request.user))
+            return http_200_response(message="Friend Request Cancelled Successfully!")
+        except ValueError:
             return http_400_response(message="Invalid ID")
         except Exception as e:
             return http_500_response(error=str(e))
@@ -113,43 +221,153 @@ class AcceptFriendRequests(ModelViewSet):
     http_method_names = ['put']
     permission_classes = (IsAuthenticated,)
     queryset = FriendRequest.objects.none()
-    serializer_class = AcceptFriendRequestsSerializer
 
     def update(self, request, pk, *args, **kwargs):
         try:
-            request_instance = FriendRequest.objects.select_related('sent_by', 'sent_to').get(id=int(pk))
+            # One conditional UPDATE; the friendship is only created when the request was still pending
+            users, error = transition_request(request.user.id, int(pk), "accept")
+            if error == "Invalid ID":
+                return http_400_response(message=error)
+            if error:
+                return http_400_response(message={'error': [error]})
 
-            serializer = self.serializer_class(request_instance, data=request.data, context={'user': request.user})
-            if serializer.is_valid():
-                serializer.save()
-                return http_201_response(message="Friend Request Accepted Successfully!")
-            else:
-                return http_400_response(message=serializer.errors)
-        except FriendRequest.DoesNotExist:
+            bump_user_generation(*users)
+            publish_event([users[0]], "friend_request.accepted", request_id=int(pk), user=event_user(request.user))
+            return http_201_response(message="Friend Request Accepted Successfully!")
+        except ValueError:
             return http_400_response(message="Invalid ID")
         except Exception as e:
             return http_500_response(error=str(e))
 
 
+# View for Accepting Many Friend Requests at once (No Cache)
+class BulkAcceptFriendRequests(ModelViewSet):
+    """ This View is Used to Accept a list of Friend Requests """
+    http_method_names = ['post']
+    permission_classes = (IsAuthenticated,)
+    queryset = FriendRequest.objects.none()
+    serializer_class = BulkFriendRequestsSerializer
+
+    def create(self, request, *args, **kwargs):
+        try:
+            serializer = self.serializer_class(data=request.data)
+            if not serializer.is_valid():
+                return http_400_response(message=serializer.errors)
+            results, sender_ids = bulk_accept_requests(request.user, serializer.validated_data['ids'])
+            bump_user_generation(request.user.id, *sender_ids)
+            # Senders come back in the order of the successful results
+            answered = [result['id'] for result in results if result['success']]
+            for request_id, sender_id in zip(answered, sender_ids):
+                publish_event([sender_id], "friend_request.accepted", request_id=request_id, user=event_user(request.user))
+            return http_200_response(message="Friend Requests Processed Successfully!", data=results)
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# View for Rejecting Many Friend Requests at once (No Cache)
+class BulkRejectFriendRequests(ModelViewSet):
+    """ This View is Used to Reject a list of Friend Requests """
+    http_method_names = ['post']
+    permission_classes = (IsAuthenticated,)
+    queryset = FriendRequest.objects.none()
+    serializer_class = BulkFriendRequestsSerializer
+
+    def create(self, request, *args, **kwargs):
+        try:
+            serializer = self.serializer_class(data=request.data)
+            if not serializer.is_valid():
+                return http_400_response(message=serializer.errors)
+            results, sender_ids = bulk_reject_requests(request.user, serializer.validated_data['ids'])
+            bump_user_generation(request.user.id, *sender_ids)
+            # Senders come back in the order of the successful results
+            answered = [result['id'] for result in results if result['success']]
+            for request_id, sender_id in zip(answered, sender_ids):
+                publish_event([sender_id], "friend_request.rejected", request_id=request_id, user=event_user(request.user))
+            return http_200_response(message="Friend Requests Processed Successfully!", data=results)
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
 # View for Viewing Friends with caching
 class ViewFriends(CacheResponseMixin, ModelViewSet):
     """ This View is Used to View Friend Listing"""
     http_method_names = ['get']
     permission_classes = (IsAuthenticated, IsReadOnly, IsNotBlocked)
-    queryset = FriendRequest.objects.none()
+    queryset = Friendship.objects.none()
     serializer_class = ViewFriendsSerializer
 
-    @cache_response()
+    @conditional_user_response()
+    @cache_user_response()
+    def list(self, request, *args, **kwargs):
+        try:
+            # Only the listed columns are selected and no model instances are built
+            friends = FriendsProjection.project(Friendship.objects.filter(
+                user=request.user
+            ))
+
+            paginator = SocialNetworkCursorPaginationClass(
+                ordering=('-since', '-id'), counter=lambda: get_count(request.user.id, 'friend_count')
+            )
+            page = paginator.paginate_queryset(friends, request)
+            serializer = FriendsProjection(page)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# Async version of ViewFriends, routed when ASYNC_READ_VIEWS is enabled
+class AsyncViewFriends(AsyncAPIView):
+    """ This View is Used to View Friend Listing under ASGI """
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated, IsReadOnly, IsNotBlocked)
+
+    @async_conditional_user_response()
+    @async_cache_user_response()
+    async def get(self, request, *args, **kwargs):
+        try:
+            # Only the listed columns are selected and no model instances are built
+            friends = FriendsProjection.project(Friendship.objects.filter(
+                user_id=request.user.id
+            ))
+
+            paginator = SocialNetworkCursorPaginationClass(
+                ordering=('-since', '-id'), counter=lambda: aget_count(request.user.id, 'friend_count')
+            )
+            page = await paginator.apaginate_queryset(friends, request)
+            serializer = FriendsProjection(page)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# View for Friend Suggestions ("People you may know")
+class ViewFriendSuggestions(ModelViewSet):
+    """ This View is Used to View Precomputed Friend Suggestions"""
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated, IsReadOnly)
+    queryset = FriendSuggestion.objects.none()
+    serializer_class = FriendSuggestionsSerializer
+
     def list(self, request, *args, **kwargs):
         try:
-            friends = FriendRequest.objects.filter(
-                Q(sent_to=request.user) | Q(sent_by=request.user), status="accepted"
-            ).select_related('sent_to', 'sent_by').order_by("-updated_on")
-            
-            serializer = self.serializer_class(friends, many=True)
-            paginator = SocialNetworkPaginationClass()
-            page = paginator.paginate_queryset(serializer.data, request)
-            return paginator.get_paginated_response(page)
+            # Suggestions are precomputed, drop the ones that became friends or got blocked since
+            blocked_users, blocked_by_users = get_block_sets(request.user.id)
+            suggestions = FriendSuggestion.objects.filter(user=request.user).exclude(
+                Exists(Friendship.objects.filter(user=request.user, friend=OuterRef('suggested_user')))
+            ).select_related('suggested_user')
+            if blocked_users or blocked_by_users:
+                suggestions = suggestions.exclude(suggested_user_id__in=blocked_users | blocked_by_users)
+
+            paginator = SocialNetworkCursorPaginationClass(ordering=('-mutual_friends', '-id'))
+            page = paginator.paginate_queryset(suggestions, request)
+            serializer = self.serializer_class(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
         except Exception as e:
             return http_500_response(error=str(e))
 
@@ -157,21 +375,26 @@ class ViewFriends(CacheResponseMixin, ModelViewSet):
 class UserProfileView(RetrieveAPIView):
     """ This View allows users to view profiles """
     permission_classes = (IsAuthenticated,)
-    
+
+    # The profile also shows the profile user's counts and the path between both users, which
+    # friendships of third parties change too: the cached path's version ends the ETag with it
+    @conditional_user_response(
+        other_users=lambda kwargs: [kwargs['user_id']],
+        version=lambda request, kwargs: get_connection_version(request.user.id, kwargs['user_id']),
+    )
     def get(self, request, *args, **kwargs):
         try:
             user = request.user
             profile_user_id = kwargs.get('user_id')
 
             # Check if user is blocked or has blocked the profile user
-            if BlockedUser.objects.filter(blocked_by=profile_user_id, blocked_user=user.id).exists() or \
-               BlockedUser.objects.filter(blocked_by=user.id, blocked_user=profile_user_id).exists():
+            if is_blocked_either_way(user.id, profile_user_id):
                 return Response({"message": "You cannot view this profile. You are blocked or have blocked this user."}, 
                                 status=status.HTTP_403_FORBIDDEN)
 
             # Proceed with profile view logic if no blocking is involved
             profile_user = UserMaster.objects.get(id=profile_user_id)
-            serializer = UserProfileSerializer(profile_user)
+            serializer = UserProfileSerializer(profile_user, context={'request': request, 'counts': get_counts(profile_user.id)})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except UserMaster.DoesNotExist:
             return Response({"message": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
@@ -179,6 +402,37 @@ class UserProfileView(RetrieveAPIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Async version of UserProfileView, routed when ASYNC_READ_VIEWS is enabled
+class AsyncUserProfileView(AsyncAPIView):
+    """ This View allows users to view profiles under ASGI """
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated,)
+
+    @async_conditional_user_response(
+        other_users=lambda kwargs: [kwargs['user_id']],
+        version=lambda request, kwargs: aget_connection_version(request.user.id, kwargs['user_id']),
+    )
+    async def get(self, request, *args, **kwargs):
+        try:
+            block_sets = await aget_block_sets(request.user.id)
+            profile_user_id = int(kwargs.get('user_id'))
+
+            # Check if user is blocked or has blocked the profile user
+            if profile_user_id in block_sets[0] or profile_user_id in block_sets[1]:
+                return Response({"message": "You cannot view this profile. You are blocked or have blocked this user."},
+                                status=status.HTTP_403_FORBIDDEN)
+
+            profile_user = await UserMaster.objects.aget(id=profile_user_id)
+            serializer = UserProfileSerializer(profile_user, context={
+                'request': request, 'block_sets': block_sets, 'counts': await aget_counts(profile_user.id),
+                'connection': await aget_connection(request.user.id, profile_user.id),
+            })
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        except UserMaster.DoesNotExist:
+            return Response({"message": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
 # View for Blocking a User (No Cache)
 class BlockUser(ModelViewSet):
@@ -192,7 +446,9 @@ class BlockUser(ModelViewSet):
         try:
             serializer = self.serializer_class(data=request.data, context={'user': request.user})
             if serializer.is_valid():
-                serializer.save()
+                block_instance = serializer.save()
+                block_changed(request.user.id, block_instance.blocked_user_id)
+                bump_user_generation(request.user.id, block_instance.blocked_user_id)
                 return http_201_response(message="User Blocked Successfully!")
             else:
                 return http_400_response(message=serializer.errors)
@@ -213,8 +469,62 @@ class UnblockUser(ModelViewSet):
             if serializer.is_valid():
                 blocked_user_id = serializer.validated_data['blocked_user_id']
                 BlockedUser.objects.filter(blocked_by=request.user, blocked_user_id=blocked_user_id).delete()
+                block_changed(request.user.id, blocked_user_id)
+                bump_user_generation(request.user.id, blocked_user_id)
                 return http_200_response(message="User Unblocked Successfully!")
             else:
                 return http_400_response(message=serializer.errors)
         except Exception as e:
             return http_500_response(error=str(e))
+
+
+# View for Unfriending a User (No Cache)
+class UnfriendUser(ModelViewSet):
+    """ This View is Used to Remove a User from the Friend List """
+    http_method_names = ['delete']
+    permission_classes = (IsAuthenticated,)
+    queryset = Friendship.objects.none()
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            serializer = UnfriendUserSerializer(data=request.data, context={'user': request.user})
+            if serializer.is_valid():
+                remove_friendship(request.user.id, serializer.validated_data['friend_id'])
+                bump_user_generation(request.user.id, serializer.validated_data['friend_id'])
+                return http_200_response(message="User Unfriended Successfully!")
+            else:
+                return http_400_response(message=serializer.errors)
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
+# View for Exporting the user's own graph as NDJSON (No Cache)
+class ExportGraph(ModelViewSet):
+    """ This View is Used to Download the user's friends, pending requests and blocks """
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated, IsReadOnly)
+    throttle_classes = (ExportThrottle,)
+    throttle_message = "You can only export 10 times in one hour"
+    queryset = Friendship.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        # Nothing runs before the first chunk is read, failures end the stream with an error record
+        response = StreamingHttpResponse(ndjson_response_chunks(export_user_graph(request.user.id)), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="graph-%d.ndjson"' % request.user.id
+        return response
+
+
+# View for Exporting the whole graph as NDJSON, for offline jobs (No Cache)
+class AdminExportGraph(ModelViewSet):
+    """ This View is Used to Download every user, friendship, friend request and block """
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated, IsAdmin)
+    throttle_classes = (ExportThrottle,)
+    throttle_message = "You can only export 10 times in one hour"
+    queryset = Friendship.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        # Nothing runs before the first chunk is read, failures end the stream with an error record
+        response = StreamingHttpResponse(ndjson_response_chunks(export_graph()), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="graph.ndjson"'
+        return response
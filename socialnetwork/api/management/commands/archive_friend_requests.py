@@ -0,0 +1,41 @@
+import datetime
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.friends.services import archive_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves answered friend requests (accepted, rejected, cancelled, expired) older than --days from "
+        "friend_requests to friend_requests_archive, one short transaction per batch. Safe to stop and rerun; "
+        "pass --start-id with the last reported id to skip the part already scanned."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=getattr(settings, "FRIEND_REQUEST_ARCHIVE_DAYS", 90),
+            help="Archive requests answered more than this many days ago",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Requests moved per transaction")
+        parser.add_argument("--start-id", type=int, default=0, help="Resume after this request id")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        moved, batches, last_id = 0, 0, options["start_id"]
+        started = time.perf_counter()
+        for last_id, count in archive_requests(cutoff, options["batch_size"], options["start_id"]):
+            moved += count
+            batches += 1
+            if options["verbosity"] > 1:
+                self.stdout.write("moved %d requests, last id %d" % (moved, last_id))
+            if options["max_batches"] and batches >= options["max_batches"]:
+                break
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write("Archived %d friend requests answered before %s in %.1f s (last id %d)" % (
+            moved, cutoff.isoformat(), time.perf_counter() - started, last_id,
+        ))
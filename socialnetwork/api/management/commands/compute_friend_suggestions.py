@@ -0,0 +1,121 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import BlockedUser, FriendRequest, FriendSuggestion, Friendship
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes friend-of-friend suggestions from the friendship graph. Mutual friend counts come from "
+        "the square of the sparse adjacency matrix, computed a chunk of users at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=20, help="Suggestions kept per user")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Users whose suggestions are computed per step")
+        parser.add_argument("--read-batch-size", type=int, default=50000, help="Rows fetched per database round trip")
+        parser.add_argument("--min-mutual", type=int, default=1, help="Minimum mutual friends for a suggestion")
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from scipy import sparse
+        except ImportError:
+            raise CommandError("compute_friend_suggestions requires numpy and scipy")
+
+        started_at = timezone.now()
+        started = time.perf_counter()
+        read_batch = options["read_batch_size"]
+
+        users, friends = self.load_pairs(np, Friendship.objects.values_list("user_id", "friend_id"), read_batch)
+        if not len(users):
+            FriendSuggestion.objects.all().delete()
+            self.stdout.write("No friendships, suggestions cleared")
+            return
+
+        # Compact user ids into matrix indexes
+        ids = np.unique(np.concatenate([users, friends]))
+        n = len(ids)
+        adjacency = sparse.csr_matrix(
+            (np.ones(len(users), dtype=np.int32), (np.searchsorted(ids, users), np.searchsorted(ids, friends))),
+            shape=(n, n),
+        )
+        excluded = self.excluded_pairs(np, sparse, ids, read_batch)
+        self.stdout.write("Loaded %d users and %d friendship edges in %.1f s" % (n, len(users), time.perf_counter() - started))
+
+        top_k, min_mutual, chunk_size = options["top_k"], options["min_mutual"], options["chunk_size"]
+        written = 0
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            block = adjacency[start:stop]
+            mutual = (block @ adjacency).tocsr()
+            # Drop existing friends, pending requests, blocks and the users themselves
+            mutual = mutual - mutual.multiply(block) - mutual.multiply(excluded[start:stop])
+            mutual.setdiag(0, k=start)
+            mutual.eliminate_zeros()
+
+            rows = []
+            for offset in range(stop - start):
+                row_start, row_end = mutual.indptr[offset], mutual.indptr[offset + 1]
+                if row_start == row_end:
+                    continue
+                counts = mutual.data[row_start:row_end]
+                columns = mutual.indices[row_start:row_end]
+                keep = np.flatnonzero(counts >= min_mutual)
+                if len(keep) > top_k:
+                    keep = keep[np.argpartition(-counts[keep], top_k - 1)[:top_k]]
+                user_id = int(ids[start + offset])
+                rows.extend(
+                    FriendSuggestion(user_id=user_id, suggested_user_id=int(ids[columns[i]]), mutual_friends=int(counts[i]))
+                    for i in keep
+                )
+
+            chunk_user_ids = [int(user_id) for user_id in ids[start:stop]]
+            with transaction.atomic():
+                FriendSuggestion.objects.filter(user_id__in=chunk_user_ids).delete()
+                FriendSuggestion.objects.bulk_create(rows, batch_size=5000)
+            written += len(rows)
+            self.stdout.write("Users %d-%d of %d: %d suggestions" % (start + 1, stop, n, len(rows)))
+
+        # Users that no longer have friends keep nothing from earlier runs
+        FriendSuggestion.objects.filter(computed_on__lt=started_at).delete()
+        self.stdout.write(self.style.SUCCESS(
+            "Wrote %d suggestions for %d users in %.1f s" % (written, n, time.perf_counter() - started)
+        ))
+
+    def load_pairs(self, np, queryset, batch_size):
+        """ Streams (a, b) id pairs into two numpy arrays without building Python lists of the whole table """
+        firsts, seconds, batch = [], [], []
+        for pair in queryset.iterator(chunk_size=batch_size):
+            batch.append(pair)
+            if len(batch) >= batch_size:
+                chunk = np.array(batch, dtype=np.int64)
+                firsts.append(chunk[:, 0])
+                seconds.append(chunk[:, 1])
+                batch = []
+        if batch:
+            chunk = np.array(batch, dtype=np.int64)
+            firsts.append(chunk[:, 0])
+            seconds.append(chunk[:, 1])
+        if not firsts:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def excluded_pairs(self, np, sparse, ids, batch_size):
+        """ Symmetric 0/1 matrix of pairs that must never be suggested: pending requests and blocks """
+        pending = FriendRequest.objects.filter(status="pending").values_list("sent_by_id", "sent_to_id")
+        blocks = BlockedUser.objects.values_list("blocked_by_id", "blocked_user_id")
+        firsts, seconds = [], []
+        for queryset in (pending, blocks):
+            a, b = self.load_pairs(np, queryset, batch_size)
+            # Pairs involving users without friends can never be suggested anyway
+            known = np.isin(a, ids) & np.isin(b, ids)
+            firsts.append(np.searchsorted(ids, a[known]))
+            seconds.append(np.searchsorted(ids, b[known]))
+        rows = np.concatenate(firsts + seconds)
+        cols = np.concatenate(seconds + firsts)
+        excluded = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(ids), len(ids)))
+        excluded.data[:] = 1  # Duplicate pairs are summed on construction
+        return excluded
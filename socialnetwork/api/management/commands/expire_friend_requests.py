@@ -0,0 +1,26 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.friends.services import expire_requests
+from socialnetwork.cache import bump_user_generation
+
+
+class Command(BaseCommand):
+    help = "Moves friend requests that have been pending for too long to the expired state, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=getattr(settings, "FRIEND_REQUEST_EXPIRY_DAYS", 30),
+            help="Expire requests pending for more than this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Requests expired per UPDATE")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        expired = 0
+        for batch in expire_requests(cutoff, batch_size=options["batch_size"]):
+            # Only the requests this run actually moved invalidate cached inboxes
+            bump_user_generation(*{user_id for users in batch.values() for user_id in users})
+            expired += len(batch)
+        self.stdout.write("Expired %d friend requests pending since before %s" % (expired, cutoff.isoformat()))
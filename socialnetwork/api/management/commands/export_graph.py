@@ -0,0 +1,32 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from api.friends.export import EXPORT_CHUNK_SIZE, export_graph, export_user_graph
+from api.models import UserMaster
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the social graph as NDJSON: every user, friendship, friend request and block, or with --user "
+        "the same export a user gets from /api/export/. Rows are streamed from the database in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only export this user's friends, pending requests and blocks")
+        parser.add_argument("--output", default="-", help="Output file, - for stdout")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="Rows fetched per round trip")
+
+    def handle(self, *args, **options):
+        if options["user"] is not None:
+            if not UserMaster.objects.filter(id=options["user"]).exists():
+                raise CommandError("No user with id %d" % options["user"])
+            chunks = export_user_graph(options["user"], options["chunk_size"])
+        else:
+            chunks = export_graph(options["chunk_size"])
+
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
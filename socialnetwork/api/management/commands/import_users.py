@@ -0,0 +1,172 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from api.models import UserMaster, UserCounters
+
+ROLES = {role for role, _ in UserMaster.ROLE_CHOICES}
+
+
+def _init_worker():
+    # Workers started with "spawn" need their own Django setup; forked ones inherit it
+    if not apps.ready:
+        django.setup()
+
+
+def read_csv(stream):
+    for record in csv.DictReader(stream):
+        yield record
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # Counted as an invalid row
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates users from a CSV (header: name,email,password[,role]) or JSON Lines file, streaming the "
+        "input in batches: passwords are hashed on a process pool using every core, emails already in the "
+        "database or repeated in the batch are skipped, and every batch is written with one bulk INSERT. "
+        "Rows without a password get an unusable one. With --checkpoint the number of rows committed is "
+        "saved after every batch and a rerun continues from there."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows hashed and inserted per batch")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing processes")
+        parser.add_argument("--role", default="Read", choices=sorted(ROLES), help="Role of rows without one")
+        parser.add_argument("--checkpoint", help="File that records the rows already imported, for resuming")
+
+    def handle(self, *args, **options):
+        input_format = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".ndjson")) else "csv")
+        if options["path"] != "-" and not os.path.exists(options["path"]):
+            raise CommandError("No such file: %s" % options["path"])
+        self.default_role = options["role"]
+        done = self.read_checkpoint(options["checkpoint"])
+
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], newline="", encoding="utf-8")
+        reader = read_jsonl if input_format == "jsonl" else read_csv
+        stats = {"read": done, "created": 0, "existing": 0, "invalid": 0}
+        started = time.perf_counter()
+        try:
+            records = itertools.islice(reader(stream), done, None)
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as executor:
+                while True:
+                    batch = list(itertools.islice(records, options["batch_size"]))
+                    if not batch:
+                        break
+                    self.import_batch(batch, executor, options["workers"], stats)
+                    stats["read"] += len(batch)
+                    self.write_checkpoint(options["checkpoint"], stats["read"])
+                    self.progress(stats, started)
+        except (ValueError, csv.Error) as e:
+            raise CommandError("Unreadable input after row %d: %s" % (stats["read"], e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(
+            "Imported %(created)d users (%(existing)d already existed or were repeated, %(invalid)d invalid rows, "
+            "%(read)d rows read)"
+            % stats
+        )
+
+    def import_batch(self, batch, executor, workers, stats):
+        # Valid rows by email; the first occurrence of a repeated email wins
+        rows = {}
+        for record in batch:
+            row = self.clean(record)
+            if row is None:
+                stats["invalid"] += 1
+            elif row["email"] in rows:
+                stats["existing"] += 1
+            else:
+                rows[row["email"]] = row
+
+        # One lookup per batch against the email unique index; only new users get hashed
+        for email in UserMaster.objects.filter(email__in=list(rows)).values_list("email", flat=True):
+            del rows[email]
+            stats["existing"] += 1
+        if not rows:
+            return
+
+        new_rows = list(rows.values())
+        chunksize = max(1, len(new_rows) // (workers * 4))
+        hashes = executor.map(make_password, [row["password"] for row in new_rows], chunksize=chunksize)
+        users = [
+            UserMaster(name=row["name"], email=row["email"], role=row["role"], password=encoded)
+            for row, encoded in zip(new_rows, hashes)
+        ]
+        with transaction.atomic():
+            # Users that signed up since the lookup are skipped by the unique index. Hashes are
+            # salted, so only the rows holding the hash made here were inserted by this batch
+            UserMaster.objects.bulk_create(users, ignore_conflicts=True)
+            hashed = {user.email: user.password for user in users}
+            user_ids = [
+                user_id
+                for user_id, email, password in UserMaster.objects.filter(email__in=list(rows)).values_list("id", "email", "password")
+                if password == hashed[email]
+            ]
+            UserCounters.objects.bulk_create([UserCounters(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        stats["created"] += len(user_ids)
+        stats["existing"] += len(users) - len(user_ids)
+
+    def clean(self, record):
+        """ Normalized ``{name, email, password, role}`` of an input record, or None when it is invalid """
+        if not isinstance(record, dict):
+            return None
+        # JSON Lines may hold numbers, lists or objects where text is expected
+        if any(not isinstance(record.get(field) or "", str) for field in ("name", "email", "role", "password")):
+            return None
+        name = (record.get("name") or "").strip()
+        email = (record.get("email") or "").strip().lower()  # Stored lowercase, like SignUp
+        role = (record.get("role") or "").strip() or self.default_role
+        if not name or len(name) > 150 or role not in ROLES:
+            return None
+        try:
+            validate_email(email)
+        except ValidationError:
+            return None
+        return {"name": name, "email": email, "password": record.get("password") or None, "role": role}
+
+    def progress(self, stats, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write("%d rows read, %d created, %d existing, %d invalid, %.0f rows/s" % (
+            stats["read"], stats["created"], stats["existing"], stats["invalid"],
+            (stats["created"] + stats["existing"] + stats["invalid"]) / elapsed if elapsed else 0,
+        ))
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+
+    @staticmethod
+    def write_checkpoint(path, rows):
+        if not path:
+            return
+        # Written to a temporary file first so an interrupted write never leaves a partial number
+        with open(path + ".tmp", "w") as checkpoint:
+            checkpoint.write(str(rows))
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from api.friends.counters import reconcile_counters
+from api.models import UserMaster
+from socialnetwork.cache import bump_user_generation
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts friend_count and pending_in_count of every user from the friendship and friend request "
+        "tables and rewrites the UserCounters rows that drifted, one batch of users at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users recounted per batch")
+        parser.add_argument("--start-id", type=int, default=0, help="Resume after this user id")
+
+    def handle(self, *args, **options):
+        last_id, checked, repaired = options["start_id"], 0, 0
+        users = UserMaster.objects.order_by('id').values_list('id', flat=True)
+        while True:
+            user_ids = list(users.filter(id__gt=last_id)[:options["batch_size"]])
+            if not user_ids:
+                break
+            fixed = reconcile_counters(user_ids)
+            # Cached list responses may carry the wrong count
+            bump_user_generation(*fixed)
+            checked += len(user_ids)
+            repaired += len(fixed)
+            last_id = user_ids[-1]
+            if options["verbosity"] > 1:
+                self.stdout.write("checked users up to id %d" % last_id)
+        self.stdout.write("Checked %d users, repaired %d counter rows" % (checked, repaired))
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_friendships(apps, schema_editor):
+    """Create both friendship edges for every accepted friend request."""
+    FriendRequest = apps.get_model('api', 'FriendRequest')
+    Friendship = apps.get_model('api', 'Friendship')
+    accepted = FriendRequest.objects.filter(status='accepted').values_list('sent_by_id', 'sent_to_id', 'updated_on')
+    batch = []
+    for sent_by_id, sent_to_id, updated_on in accepted.iterator(chunk_size=2000):
+        batch.append(Friendship(user_id=sent_by_id, friend_id=sent_to_id, since=updated_on))
+        batch.append(Friendship(user_id=sent_to_id, friend_id=sent_by_id, since=updated_on))
+        if len(batch) >= 2000:
+            Friendship.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Friendship.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_blockeduser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField()),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_of', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'friendships',
+                'indexes': [models.Index(fields=['user', '-since'], name='friendship_user_since_idx')],
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(backfill_friendships, migrations.RunPython.noop),
+    ]
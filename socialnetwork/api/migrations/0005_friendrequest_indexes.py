@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:40
+
+from django.db import migrations, models
+from api.db_operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently so friend_requests stays writable during the migration
+    atomic = False
+
+    dependencies = [
+        ('api', '0004_friendship'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='friendrequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted')], default='pending', max_length=10),
+        ),
+        AddIndexOnline(
+            model_name='blockeduser',
+            index=models.Index(fields=['blocked_user', 'blocked_by'], name='blocked_reverse_idx'),
+        ),
+        AddIndexOnline(
+            model_name='friendrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['sent_to', '-created_on'], name='fr_pending_inbox_idx'),
+        ),
+        AddIndexOnline(
+            model_name='friendrequest',
+            index=models.Index(fields=['sent_by', 'sent_to', 'status'], name='fr_sender_recipient_idx'),
+        ),
+        AddIndexOnline(
+            model_name='friendrequest',
+            index=models.Index(fields=['sent_by', 'created_on'], name='fr_sender_created_idx'),
+        ),
+    ]
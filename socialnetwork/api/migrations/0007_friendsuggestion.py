@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutual_friends', models.PositiveIntegerField()),
+                ('computed_on', models.DateTimeField(auto_now_add=True)),
+                ('suggested_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'friend_suggestions',
+                'indexes': [models.Index(fields=['user', '-mutual_friends'], name='suggestion_user_rank_idx')],
+                'unique_together': {('user', 'suggested_user')},
+            },
+        ),
+    ]
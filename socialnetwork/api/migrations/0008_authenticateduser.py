@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:47
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthenticatedUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('api.usermaster',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
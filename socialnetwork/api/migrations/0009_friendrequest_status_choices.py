@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_authenticateduser'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='friendrequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='pending', max_length=10),
+        ),
+    ]
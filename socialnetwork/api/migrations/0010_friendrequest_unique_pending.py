@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from api.db_operations import AddUniqueConstraintOnline
+
+
+def cancel_duplicate_pending(apps, schema_editor):
+    """Keep the oldest pending request per (sender, recipient) and cancel the others."""
+    FriendRequest = apps.get_model('api', 'FriendRequest')
+    duplicates = (
+        FriendRequest.objects.filter(status='pending')
+        .values('sent_by_id', 'sent_to_id')
+        .annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        FriendRequest.objects.filter(
+            status='pending', sent_by_id=row['sent_by_id'], sent_to_id=row['sent_to_id'],
+        ).exclude(id=row['keep']).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+    # The unique index is built concurrently so friend_requests stays writable during the migration
+    atomic = False
+
+    dependencies = [
+        ('api', '0009_friendrequest_status_choices'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_pending, migrations.RunPython.noop, atomic=True),
+        AddUniqueConstraintOnline(
+            model_name='friendrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('sent_by', 'sent_to'), name='fr_unique_pending'),
+        ),
+    ]
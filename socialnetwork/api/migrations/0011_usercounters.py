@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    """Count friendships and received pending requests for every user, in batches of users."""
+    UserMaster = apps.get_model('api', 'UserMaster')
+    UserCounters = apps.get_model('api', 'UserCounters')
+    Friendship = apps.get_model('api', 'Friendship')
+    FriendRequest = apps.get_model('api', 'FriendRequest')
+    user_ids = list(UserMaster.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(user_ids), 2000):
+        batch = user_ids[start:start + 2000]
+        friends = dict(
+            Friendship.objects.filter(user_id__in=batch).values('user_id').annotate(total=Count('id'))
+            .order_by().values_list('user_id', 'total')
+        )
+        pending = dict(
+            FriendRequest.objects.filter(sent_to_id__in=batch, status='pending').values('sent_to_id')
+            .annotate(total=Count('id')).order_by().values_list('sent_to_id', 'total')
+        )
+        UserCounters.objects.bulk_create([
+            UserCounters(user_id=user_id, friend_count=friends.get(user_id, 0), pending_in_count=pending.get(user_id, 0))
+            for user_id in batch
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_friendrequest_unique_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('friend_count', models.IntegerField(default=0)),
+                ('pending_in_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'user_counters',
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Lower, Upper
 
 class UserMaster(AbstractUser):
     ROLE_CHOICES = (
@@ -28,18 +30,90 @@ class UserMaster(AbstractUser):
 
     class Meta:
         db_table = "user_master"
+        indexes = [
+            # Trigram index so "name contains" searches (UPPER(name) LIKE ...) avoid a sequential scan
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='user_name_trgm_idx'),
+            # Case-insensitive exact email lookups
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
+
+class AuthenticatedUser(UserMaster):
+    """
+    Request user built from the JWT claims (see socialnetwork.authentication). Only ``id``, ``name``
+    and ``role`` are set; the first access to any other field loads the rest of the row,
+    from the short-lived in-process user cache when possible.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not deferred.issuperset(fields):
+            return super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+        from socialnetwork.authentication import user_cache
+        user = user_cache.get(self.pk)
+        for attname in deferred:
+            self.__dict__[attname] = user.__dict__[attname]
 
 
 
 class FriendRequest(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),  # Waiting for the recipient
+        ('accepted', 'Accepted'),  # Recipient accepted the request
+        ('rejected', 'Rejected'),  # Recipient rejected the request
+        ('cancelled', 'Cancelled'),  # Sender withdrew the request
+        ('expired', 'Expired'),  # Nobody answered in time, see expire_friend_requests
+    )
+
     sent_to = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="sent_to")
     sent_by = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="sent_by")
-    status = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "friend_requests"
+        indexes = [
+            # Inbox listing and "recipient already asked me" checks only ever look at pending rows
+            models.Index(
+                fields=['sent_to', '-created_on'],
+                name='fr_pending_inbox_idx',
+                condition=models.Q(status='pending'),
+            ),
+            # Duplicate checks between a sender and a recipient
+            models.Index(fields=['sent_by', 'sent_to', 'status'], name='fr_sender_recipient_idx'),
+            # Per-sender history ordered by time
+            models.Index(fields=['sent_by', 'created_on'], name='fr_sender_created_idx'),
+        ]
+        constraints = [
+            # At most one pending request per direction; the send path inserts with ON CONFLICT DO NOTHING on it
+            models.UniqueConstraint(
+                fields=['sent_by', 'sent_to'],
+                condition=models.Q(status='pending'),
+                name='fr_unique_pending',
+            ),
+        ]
+
+class FriendRequestArchive(models.Model):
+    """
+    Answered friend requests moved out of ``friend_requests`` by ``archive_friend_requests``, so
+    the live table and its indexes only hold pending and recently answered rows. Rows keep
+    their original id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sent_to = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="+")
+    sent_by = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="+")
+    status = models.CharField(max_length=10, choices=FriendRequest.STATUS_CHOICES)
+    created_on = models.DateTimeField()
+    updated_on = models.DateTimeField()
+    archived_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "friend_requests_archive"
 
 class BlockedUser(models.Model):
     blocked_by = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="blocked_by")
@@ -49,6 +123,59 @@ class BlockedUser(models.Model):
     class Meta:
         db_table = "blocked_users"
         unique_together = ('blocked_by', 'blocked_user')  # Prevent duplicate blocks
+        indexes = [
+            # "Who blocked me" lookups
+            models.Index(fields=['blocked_user', 'blocked_by'], name='blocked_reverse_idx'),
+        ]
 
     def __str__(self):
         return f"{self.blocked_by.email} blocked {self.blocked_user.email}"
+
+
+class Friendship(models.Model):
+    """
+    Materialized friendship edge. Every accepted friend request is stored twice,
+    once per direction, so a user's friends are a single range scan on (user, since).
+    """
+    user = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="friendships")
+    friend = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="friend_of")
+    since = models.DateTimeField()
+
+    class Meta:
+        db_table = "friendships"
+        unique_together = ('user', 'friend')  # One edge per direction
+        indexes = [
+            models.Index(fields=['user', '-since'], name='friendship_user_since_idx'),
+        ]
+
+
+class FriendSuggestion(models.Model):
+    """
+    Precomputed "people you may know" entry, written in bulk by the
+    ``compute_friend_suggestions`` management command.
+    """
+    user = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="suggestions")
+    suggested_user = models.ForeignKey(UserMaster, on_delete=models.CASCADE, related_name="suggested_to")
+    mutual_friends = models.PositiveIntegerField()
+    computed_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "friend_suggestions"
+        unique_together = ('user', 'suggested_user')
+        indexes = [
+            models.Index(fields=['user', '-mutual_friends'], name='suggestion_user_rank_idx'),
+        ]
+
+
+class UserCounters(models.Model):
+    """
+    Denormalized per-user counts, kept in their own table so counter updates do not lock the
+    ``user_master`` row. Updated with F() expressions in the same transaction as the writes
+    that change them (see api.friends.counters); ``reconcile_counters`` repairs any drift.
+    """
+    user = models.OneToOneField(UserMaster, on_delete=models.CASCADE, primary_key=True, related_name="counters")
+    friend_count = models.IntegerField(default=0)  # Friendship edges of the user
+    pending_in_count = models.IntegerField(default=0)  # Pending friend requests received
+
+    class Meta:
+        db_table = "user_counters"
@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission
+from api.friends.blocks import aget_block_sets, get_blocked_by_ids
 
 class IsReadOnly(BasePermission):
     """
@@ -28,9 +29,18 @@ class IsNotBlocked(BasePermission):
     def has_permission(self, request, view):
         # Check if the requesting user is blocked by the profile owner
         if request.user.is_authenticated:
-            blocked_users = BlockedUser.objects.filter(blocked_user=request.user).values_list('blocked_by_id', flat=True)
             # Assuming 'profile_owner' is passed in request or obtained from view logic
             profile_owner_id = view.kwargs.get('profile_owner_id')
-            if profile_owner_id in blocked_users:
+            if profile_owner_id is not None and int(profile_owner_id) in get_blocked_by_ids(request.user.id):
                 return False
         return True
+
+    async def ahas_permission(self, request, view):
+        # Used by the async views, the block sets come from the async cache API
+        if request.user.is_authenticated:
+            profile_owner_id = view.kwargs.get('profile_owner_id')
+            if profile_owner_id is not None:
+                blocked_by_users = (await aget_block_sets(request.user.id))[1]
+                if int(profile_owner_id) in blocked_by_users:
+                    return False
+        return True
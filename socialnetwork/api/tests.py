@@ -1,3 +1,96 @@
-from django.test import TestCase
+import time
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from api.models import UserMaster, UserCounters, FriendRequest, BlockedUser
+from api.friends.services import send_request, add_friendships, remove_friendship
+from socialnetwork.tokens import get_access_token
 
-# Create your tests here.
+
+class SendRequestQueriesTest(TestCase):
+    """ send_request() costs the guarded INSERT plus one query, whatever the outcome """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.recipient, cls.other = (
+            UserMaster.objects.create(name="User %d" % number, email="user%d@example.com" % number)
+            for number in range(3)
+        )
+        UserCounters.objects.bulk_create([UserCounters(user=user) for user in (cls.sender, cls.recipient, cls.other)])
+
+    def send(self, recipient_id):
+        # INSERT ... RETURNING, then the counter UPDATE on success or the explaining SELECT on failure
+        with self.assertNumQueries(2):
+            return send_request(self.sender.id, recipient_id)
+
+    def test_success(self):
+        request_id, error = self.send(self.recipient.id)
+        self.assertIsNone(error)
+        self.assertTrue(FriendRequest.objects.filter(id=request_id, sent_by=self.sender, sent_to=self.recipient, status="pending").exists())
+        self.assertEqual(UserCounters.objects.get(user=self.recipient).pending_in_count, 1)
+
+    def test_pending(self):
+        FriendRequest.objects.create(sent_by=self.sender, sent_to=self.recipient, status="pending")
+        self.assertEqual(self.send(self.recipient.id), (None, "pending"))
+        self.assertEqual(FriendRequest.objects.filter(sent_by=self.sender, sent_to=self.recipient).count(), 1)
+        self.assertEqual(UserCounters.objects.get(user=self.recipient).pending_in_count, 0)
+
+    def test_reverse_pending(self):
+        FriendRequest.objects.create(sent_by=self.recipient, sent_to=self.sender, status="pending")
+        self.assertEqual(self.send(self.recipient.id), (None, "reverse_pending"))
+        self.assertFalse(FriendRequest.objects.filter(sent_by=self.sender).exists())
+
+    def test_blocked(self):
+        BlockedUser.objects.create(blocked_by=self.sender, blocked_user=self.recipient)
+        self.assertEqual(self.send(self.recipient.id), (None, "blocked"))
+
+    def test_blocked_by(self):
+        BlockedUser.objects.create(blocked_by=self.recipient, blocked_user=self.sender)
+        self.assertEqual(self.send(self.recipient.id), (None, "blocked_by"))
+
+    def test_invalid(self):
+        self.assertEqual(self.send(self.other.id + 1000), (None, "invalid"))
+        self.assertFalse(FriendRequest.objects.exists())
+
+    def test_self(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(send_request(self.sender.id, self.sender.id), (None, "self"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProfileETagTest(TestCase):
+    """ The profile's connection depends on third-party friendships, its ETag has to follow them """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.p, cls.q, cls.r, cls.s = (
+            UserMaster.objects.create(name=name, email="%s@example.com" % name) for name in "pqrs"
+        )
+        add_friendships([(cls.p.id, cls.q.id), (cls.q.id, cls.r.id), (cls.r.id, cls.s.id)])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_profile(self, **headers):
+        return self.client.get(
+            "/api/profile/%d/" % self.s.id, HTTP_AUTHORIZATION="Bearer " + get_access_token(self.p), **headers,
+        )
+
+    def test_third_party_unfriend_shows_up_after_connection_cache_timeout(self):
+        response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["connection"]["degree"], 3)
+        etag = response["ETag"]
+
+        # Neither p nor s writes anything, so their generations stay the same
+        remove_friendship(self.q.id, self.r.id)
+        self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        later = time.time() + settings.CONNECTION_CACHE_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later):
+            response = self.get_profile(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data["connection"]["degree"])
+            self.assertNotEqual(response["ETag"], etag)
+            self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from api.users.views import SignUp, Login, FindUsers
+from api.users.views import SignUp, Login, FindUsers, AsyncFindUsers, AsyncSignUp, AsyncLogin
 from api.friends.views import (
-    SendFriendRequests, ViewPendingRequests, RejectFriendRequests, 
-    AcceptFriendRequests, ViewFriends, BlockUser, UnblockUser
+    SendFriendRequests, ViewPendingRequests, RejectFriendRequests, CancelFriendRequests,
+    AcceptFriendRequests, BulkSendFriendRequests, BulkAcceptFriendRequests, BulkRejectFriendRequests, ViewFriends, ViewFriendSuggestions, UnfriendUser, BlockUser, UnblockUser, UserProfileView,
+    AsyncViewPendingRequests, AsyncViewFriends, AsyncUserProfileView, ExportGraph, AdminExportGraph
 )
 
 # Create routers for users and friends
@@ -19,13 +21,42 @@ router.register('send_request', SendFriendRequests, basename="send_request")
 router.register('pending_requests', ViewPendingRequests, basename="pending_requests")
 router.register('reject_request', RejectFriendRequests, basename="reject_request")
 router.register('accept_request', AcceptFriendRequests, basename="accept_request")
+router.register('cancel_request', CancelFriendRequests, basename="cancel_request")
 router.register('view_friends', ViewFriends, basename="view_friends")
 
+# Bulk friend request routes
+router.register('bulk_send_requests', BulkSendFriendRequests, basename="bulk_send_requests")
+router.register('bulk_accept_requests', BulkAcceptFriendRequests, basename="bulk_accept_requests")
+router.register('bulk_reject_requests', BulkRejectFriendRequests, basename="bulk_reject_requests")
+router.register('unfriend', UnfriendUser, basename="unfriend")
+router.register('suggestions', ViewFriendSuggestions, basename="suggestions")
+
 # Block/Unblock user routes
 router.register('block_user', BlockUser, basename="block_user")
 router.register('unblock_user', UnblockUser, basename="unblock_user")
 
+# NDJSON export routes
+router.register('export', ExportGraph, basename="export")
+router.register('admin_export', AdminExportGraph, basename="admin_export")
+
 # Define URL patterns
 urlpatterns = [
     path("", include(router.urls)),
+    path("profile/<int:user_id>/", UserProfileView.as_view(), name="profile"),
 ]
+
+# Native async read endpoints on the same paths, they take precedence over the router
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path("pending_requests/", AsyncViewPendingRequests.as_view(), name="pending_requests-list"),
+        path("view_friends/", AsyncViewFriends.as_view(), name="view_friends-list"),
+        path("users/", AsyncFindUsers.as_view(), name="users-list"),
+        path("profile/<int:user_id>/", AsyncUserProfileView.as_view(), name="profile"),
+    ] + urlpatterns
+
+# Native async Login and SignUp, so password hashing does not hold a request thread
+if settings.ASYNC_AUTH_VIEWS:
+    urlpatterns = [
+        path("signup/", AsyncSignUp.as_view(), name="signup-list"),
+        path("login/", AsyncLogin.as_view(), name="login-list"),
+    ] + urlpatterns
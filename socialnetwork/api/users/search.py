@@ -0,0 +1,37 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Lower
+
+# Relevance boosts added on top of the name similarity
+EXACT_EMAIL_BOOST = 3.0
+PREFIX_BOOST = 1.0
+
+
+def search_users(queryset, term):
+    """
+    Filters ``queryset`` to users whose name contains ``term`` or whose email is ``term`` and
+    annotates a ``rank`` to order them by: exact email matches first, then names starting with
+    ``term``, then by trigram similarity of the name.
+
+    On PostgreSQL the name filter is served by the ``user_name_trgm_idx`` trigram index and the
+    email filter by ``user_email_lower_idx``. Other databases (SQLite in local runs) use the same
+    filters without similarity scoring.
+    """
+    term = term.strip()
+    queryset = queryset.annotate(email_lower=Lower('email')).filter(
+        Q(name__icontains=term) | Q(email_lower=term.lower())
+    )
+
+    if connection.vendor == 'postgresql':
+        similarity = TrigramSimilarity('name', term)
+    else:
+        similarity = Value(0.0, output_field=FloatField())
+
+    boost = Case(
+        When(email_lower=term.lower(), then=Value(EXACT_EMAIL_BOOST)),
+        When(name__istartswith=term, then=Value(PREFIX_BOOST)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return queryset.annotate(rank=boost + similarity)
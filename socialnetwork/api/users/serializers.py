@@ -1,6 +1,8 @@
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
-from api.models import UserMaster
-from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from api.models import UserMaster, UserCounters
+from socialnetwork.hashing import hash_password, ahash_password, verify_password, averify_password
 from socialnetwork.tokens import get_access_token, get_refresh_token
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -20,12 +22,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
+        hashed_password = hash_password(validated_data.get('password'))  # Runs on the password hashing pool
+        self.create_user(validated_data, hashed_password)
+        return validated_data
+
+    async def acreate(self):
+        """ save() for the async SignUp view, call after is_valid() """
+        hashed_password = await ahash_password(self.validated_data.get('password'))
+        await sync_to_async(self.create_user)(self.validated_data, hashed_password)
+        return self.validated_data
+
+    def create_user(self, validated_data, hashed_password):
         name = validated_data.get('name')
         email = validated_data.get('email').lower()  # Convert email to lowercase
-        password = validated_data.get('password')
-        hashed_password = make_password(password)
-        UserMaster.objects.create(name=name, email=email, password=hashed_password)
-        return validated_data
+        with transaction.atomic():
+            user = UserMaster.objects.create(name=name, email=email, password=hashed_password)
+            UserCounters.objects.create(user=user)
+        return user
 
 
 class UserLoginSerializer(serializers.ModelSerializer):
@@ -43,12 +56,34 @@ class UserLoginSerializer(serializers.ModelSerializer):
         except UserMaster.DoesNotExist:
             raise serializers.ValidationError({'error': "Invalid Email"})
         
-        if not user.check_password(attrs.get("password")):
+        if not verify_password(user, attrs.get("password")):
             raise serializers.ValidationError({'error': "Invalid Password"})
         
         return attrs, user
 
 
+class AsyncUserLoginSerializer(UserLoginSerializer):
+    """
+    UserLoginSerializer for the async Login view: is_valid() only checks the fields, which needs
+    no database, and avalidate_credentials() then looks the user up and checks the password
+    """
+
+    def validate(self, attrs):
+        return attrs
+
+    async def avalidate_credentials(self):
+        email = self.validated_data.get('email').lower()  # Convert email to lowercase
+        try:
+            user = await UserMaster.objects.aget(email=email)
+        except UserMaster.DoesNotExist:
+            raise serializers.ValidationError({'error': "Invalid Email"})
+
+        if not await averify_password(user, self.validated_data.get("password")):
+            raise serializers.ValidationError({'error': "Invalid Password"})
+
+        return user
+
+
 class UserLoginDataSerialzier(serializers.ModelSerializer):
     access_token = serializers.SerializerMethodField()
     refresh_token = serializers.SerializerMethodField()
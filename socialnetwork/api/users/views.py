@@ -3,10 +3,18 @@ from rest_framework_extensions.cache.mixins import CacheResponseMixin
 from rest_framework.viewsets import ModelViewSet
 from django.db.models import Q
 from api.models import UserMaster
-from socialnetwork.paginations import SocialNetworkPaginationClass
-from socialnetwork.responses import http_200_response, http_201_response, http_400_response, http_500_response
-from api.users.serializers import UserRegistrationSerializer, UserLoginSerializer, UserLoginDataSerialzier, UserListSerializer
+from rest_framework.exceptions import NotFound
+from socialnetwork.paginations import SocialNetworkCursorPaginationClass
+from socialnetwork.responses import http_200_response, http_201_response, http_400_response, http_500_response, http_503_response
+from socialnetwork.hashing import HashingPoolFull
+from api.users.search import search_users
+from api.friends.blocks import get_block_sets, aget_block_sets
+from socialnetwork.async_views import AsyncAPIView
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ValidationError
+from api.users.serializers import UserRegistrationSerializer, UserLoginSerializer, AsyncUserLoginSerializer, UserLoginDataSerialzier, UserListSerializer
 from api.permissions import IsReadOnly, IsWrite, IsAdmin
+from socialnetwork.throttles import LoginThrottle, SignUpThrottle, UserSearchThrottle
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 
@@ -14,6 +22,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 class SignUp(ModelViewSet):
     http_method_names = ['post']
     permission_classes = (AllowAny,)
+    throttle_classes = (SignUpThrottle,)
     queryset = UserMaster.objects.all()
     serializer_class = UserRegistrationSerializer
 
@@ -30,6 +39,8 @@ class SignUp(ModelViewSet):
                     )
                 else:
                     return http_400_response(message=serializer.errors[list(serializer.errors.keys())[0]][0])
+        except HashingPoolFull:
+            return http_503_response(message="Server is busy, please try again", retry_after=1)
         except Exception as e:
             return http_500_response(error=str(e))
 
@@ -37,6 +48,7 @@ class SignUp(ModelViewSet):
 class Login(ModelViewSet):
     http_method_names = ['post']
     permission_classes = (AllowAny,)
+    throttle_classes = (LoginThrottle,)
     queryset = UserMaster.objects.all()
     serializer_class = UserLoginSerializer
 
@@ -54,6 +66,63 @@ class Login(ModelViewSet):
                     )
                 else:
                     return http_400_response(message=serializer.errors[list(serializer.errors.keys())[0]][0])
+        except HashingPoolFull:
+            return http_503_response(message="Server is busy, please try again", retry_after=1)
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+# Async version of SignUp, routed when ASYNC_AUTH_VIEWS is enabled
+class AsyncSignUp(AsyncAPIView):
+    """Registers a user under ASGI; the password is hashed on the pool while the event loop serves other requests."""
+    http_method_names = ['post']
+    permission_classes = (AllowAny,)
+    throttle_classes = (SignUpThrottle,)
+    serializer_class = UserRegistrationSerializer
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            serializer = self.serializer_class(data=request.data)
+            if await sync_to_async(serializer.is_valid)():  # The unique email check queries the database
+                await serializer.acreate()
+                return http_201_response(message="User Registered Successfully!")
+            else:
+                if list(serializer.errors.keys())[0] != "error":
+                    return http_400_response(
+                        message=f"{list(serializer.errors.keys())[0]} : {serializer.errors[list(serializer.errors.keys())[0]][0]}"
+                    )
+                else:
+                    return http_400_response(message=serializer.errors[list(serializer.errors.keys())[0]][0])
+        except HashingPoolFull:
+            return http_503_response(message="Server is busy, please try again", retry_after=1)
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+# Async version of Login, routed when ASYNC_AUTH_VIEWS is enabled
+class AsyncLogin(AsyncAPIView):
+    """Logs a user in under ASGI; the password is checked on the pool while the event loop serves other requests."""
+    http_method_names = ['post']
+    permission_classes = (AllowAny,)
+    throttle_classes = (LoginThrottle,)
+    serializer_class = AsyncUserLoginSerializer
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            serializer = self.serializer_class(data=request.data)
+            if serializer.is_valid():
+                user = await serializer.avalidate_credentials()
+                login_data = UserLoginDataSerialzier(user).data
+                return http_200_response(message="Login Success!", data=login_data)
+            else:
+                if list(serializer.errors.keys())[0] != "error":
+                    return http_400_response(
+                        message=f"{list(serializer.errors.keys())[0]} : {serializer.errors[list(serializer.errors.keys())[0]][0]}"
+                    )
+                else:
+                    return http_400_response(message=serializer.errors[list(serializer.errors.keys())[0]][0])
+        except ValidationError as e:
+            return http_400_response(message=e.detail['error'])
+        except HashingPoolFull:
+            return http_503_response(message="Server is busy, please try again", retry_after=1)
         except Exception as e:
             return http_500_response(error=str(e))
 
@@ -62,26 +131,63 @@ class FindUsers(ModelViewSet):
     """This View lists all users, filters them based on name or email."""
     http_method_names = ['get']
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (UserSearchThrottle,)
     queryset = UserMaster.objects.all()
     serializer_class = UserListSerializer
 
     def list(self, request, *args, **kwargs):
         try:
-            users = UserMaster.objects.exclude(email=request.user.email)  # Exclude logged-in user
+            blocked_users, blocked_by_users = get_block_sets(request.user.id)
+            users = UserMaster.objects.exclude(id=request.user.id)  # Exclude logged-in user
+            if blocked_users or blocked_by_users:
+                users = users.exclude(id__in=blocked_users | blocked_by_users)  # Exclude blocked users in the same query
             search = request.query_params.get('search')  # Read from query parameter
-            if search:
-                users = users.filter(Q(name__icontains=search) | Q(email__iexact=search))  # Filter users based on name or email
-            serializer = self.serializer_class(users, many=True)  # Serialize objects
-            paginator = SocialNetworkPaginationClass()  # Initialize pagination class
-            page = paginator.paginate_queryset(serializer.data, request) 
-            return paginator.get_paginated_response(page)  # Return response in pages
+            if search and search.strip():
+                users = search_users(users, search)  # Filter users based on name or email, ranked by relevance
+                paginator = SocialNetworkCursorPaginationClass(ordering=('-rank', '-id'))
+            else:
+                paginator = SocialNetworkCursorPaginationClass(ordering=('-created_on', '-id'))  # Paginate in SQL
+            page = paginator.paginate_queryset(users, request)
+            serializer = self.serializer_class(page, many=True)  # Serialize only the current page
+            return paginator.get_paginated_response(serializer.data)  # Return response in pages
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return http_500_response(error=str(e))
 
     def retrieve(self, request, *args, **kwargs):
         pass  # This method is intentionally left blank
 
 
+# Async version of FindUsers, routed when ASYNC_READ_VIEWS is enabled
+class AsyncFindUsers(AsyncAPIView):
+    """This View lists all users, filters them based on name or email, under ASGI."""
+    http_method_names = ['get']
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (UserSearchThrottle,)
+    serializer_class = UserListSerializer
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            blocked_users, blocked_by_users = await aget_block_sets(request.user.id)
+            users = UserMaster.objects.exclude(id=request.user.id)
+            if blocked_users or blocked_by_users:
+                users = users.exclude(id__in=blocked_users | blocked_by_users)
+            search = request.query_params.get('search')
+            if search and search.strip():
+                users = search_users(users, search)
+                paginator = SocialNetworkCursorPaginationClass(ordering=('-rank', '-id'))
+            else:
+                paginator = SocialNetworkCursorPaginationClass(ordering=('-created_on', '-id'))
+            page = await paginator.apaginate_queryset(users, request)
+            serializer = self.serializer_class(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return http_400_response(message=str(e.detail))
+        except Exception as e:
+            return http_500_response(error=str(e))
+
+
 # Admin-only view for deleting users
 class AdminDeleteUser(ModelViewSet):
     permission_classes = (IsAdmin,)  # Only 'Admin' users can delete users
@@ -0,0 +1,123 @@
+import asyncio
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from api.models import UserMaster, FriendRequest
+from api.friends.services import add_friendships
+from socialnetwork.tokens import get_access_token
+
+BENCH_EMAIL_DOMAIN = "bench-async.invalid"
+READ_PATHS = ("/api/pending_requests/", "/api/view_friends/", "/api/users/", "/api/users/?search=bench")
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens many concurrent keep-alive clients against a running server and reports latency and "
+        "throughput of the read endpoints. Run it once against `uvicorn socialnetwork.asgi:application` "
+        "and once with ASYNC_READ_VIEWS=1 to compare the sync and async views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--clients", type=int, default=1000, help="Concurrent connections")
+        parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+        parser.add_argument("--users", type=int, default=200, help="Distinct users the clients authenticate as")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("Only plain http:// URLs are supported")
+        tokens = [get_access_token(user) for user in self.bench_users(options["users"])]
+        timings, errors, elapsed = asyncio.run(self.run(url, tokens, options))
+
+        total = len(timings) + errors
+        self.stdout.write("clients=%d requests=%d errors=%d elapsed=%.1fs throughput=%.1f req/s" % (
+            options["clients"], total, errors, elapsed, total / elapsed,
+        ))
+        if timings:
+            timings.sort()
+            self.stdout.write("latency p50=%.1f ms  p95=%.1f ms  p99=%.1f ms" % (
+                statistics.median(timings),
+                timings[max(int(len(timings) * 0.95) - 1, 0)], timings[max(int(len(timings) * 0.99) - 1, 0)],
+            ))
+
+    def bench_users(self, count):
+        users = list(UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).order_by("id")[:count])
+        if len(users) < count:
+            encoded = make_password(None)  # Unusable, the benchmark authenticates with tokens only
+            UserMaster.objects.bulk_create([
+                UserMaster(name="Bench User %d" % number, email="user%d@%s" % (number, BENCH_EMAIL_DOMAIN),
+                           password=encoded, role="Write")
+                for number in range(len(users), count)
+            ])
+            users = list(UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).order_by("id")[:count])
+            # Give every user a few friends and pending requests so the pages are not empty
+            rng = random.Random(0)
+            pairs, requests = set(), []
+            for user in users:
+                for other in rng.sample(users, min(10, len(users))):
+                    if other.id != user.id:
+                        pairs.add((min(user.id, other.id), max(user.id, other.id)))
+                for other in rng.sample(users, min(5, len(users))):
+                    if other.id != user.id and (min(user.id, other.id), max(user.id, other.id)) not in pairs:
+                        requests.append(FriendRequest(sent_by=other, sent_to=user))
+            add_friendships(pairs)
+            FriendRequest.objects.bulk_create(requests)
+        return users
+
+    async def run(self, url, tokens, options):
+        port = url.port or 80
+        timings, errors = [], 0
+        started = time.perf_counter()
+
+        async def client(number):
+            nonlocal errors
+            rng = random.Random(number)
+            token = tokens[number % len(tokens)]
+            reader, writer = await asyncio.open_connection(url.hostname, port)
+            try:
+                for _ in range(options["requests"]):
+                    path = rng.choice(READ_PATHS)
+                    request_started = time.perf_counter()
+                    writer.write((
+                        "GET %s HTTP/1.1\r\nHost: %s\r\nAuthorization: Bearer %s\r\nConnection: keep-alive\r\n\r\n"
+                        % (path, url.netloc, token)
+                    ).encode("ascii"))
+                    await writer.drain()
+                    status = await self.read_response(reader)
+                    if status >= 400:
+                        errors += 1
+                    else:
+                        timings.append((time.perf_counter() - request_started) * 1000)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+            finally:
+                writer.close()
+
+        await asyncio.gather(*(client(number) for number in range(options["clients"])))
+        return timings, errors, time.perf_counter() - started
+
+    @staticmethod
+    async def read_response(reader):
+        """ Reads one HTTP/1.1 response and returns its status code """
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.readexactly(int(headers.get("content-length", 0)))
+        return status
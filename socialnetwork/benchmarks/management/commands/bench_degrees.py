@@ -0,0 +1,80 @@
+import collections
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.models import UserMaster
+from api.friends.paths import find_path, get_connection
+from benchmarks.management.commands.generate_graph import GRAPH_EMAIL_DOMAIN
+from benchmarks.management.commands.run_benchmarks import QueryCounter
+from benchmarks.stats import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Times degree-of-separation lookups between random pairs of the power-law graph made by "
+        "generate_graph: the bidirectional search on its own, get_connection with a cold cache and "
+        "get_connection again from the cache. Reports latency, queries per lookup and the degree histogram."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pairs", type=int, default=500, help="Random user pairs looked up")
+        parser.add_argument("--max-depth", type=int, default=getattr(settings, "CONNECTION_MAX_DEPTH", 3))
+        parser.add_argument("--max-frontier", type=int, default=getattr(settings, "CONNECTION_MAX_FRONTIER", 10_000))
+        parser.add_argument("--max-edges", type=int, default=getattr(settings, "CONNECTION_MAX_EDGES", 20_000))
+        parser.add_argument("--seed", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user_ids = list(
+            UserMaster.objects.filter(email__endswith="@" + GRAPH_EMAIL_DOMAIN, email__startswith="user")
+            .values_list("id", flat=True)
+        )
+        if len(user_ids) < 2:
+            raise CommandError("No generated graph found, run generate_graph first")
+        pairs = [tuple(rng.sample(user_ids, 2)) for _ in range(options["pairs"])]
+
+        degrees, truncated = collections.Counter(), 0
+        timings, queries = [], []
+        for source_id, target_id in pairs:
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                path, stopped = find_path(
+                    source_id, target_id, max_depth=options["max_depth"], max_frontier=options["max_frontier"],
+                    max_edges=options["max_edges"],
+                )
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            degrees[len(path) - 1 if path else None] += 1
+            truncated += stopped
+        self.report("search", timings, queries)
+
+        cache.clear()
+        for label in ("get_connection cold", "get_connection cached"):
+            timings, queries = [], []
+            for source_id, target_id in pairs:
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    get_connection(source_id, target_id)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count)
+            self.report(label, timings, queries)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("degrees (max depth %d):" % options["max_depth"]))
+        for degree in sorted(degrees, key=lambda degree: (degree is None, degree)):
+            label = "none" if degree is None else str(degree)
+            self.stdout.write("  %-5s %6d  %5.1f%%" % (label, degrees[degree], 100 * degrees[degree] / len(pairs)))
+        self.stdout.write("  %d searches stopped at the caps of %d users or %d friendships per hop" % (
+            truncated, options["max_frontier"], options["max_edges"],
+        ))
+
+    def report(self, label, timings, queries):
+        summary = summarize(timings)
+        self.stdout.write("%-22s p50=%8.3f ms  p95=%8.3f ms  p99=%8.3f ms  max=%8.3f ms  queries=%4.1f (max %d)" % (
+            label, summary["p50_ms"], summary["p95_ms"], summary["p99_ms"], summary["max_ms"],
+            sum(queries) / len(queries), max(queries),
+        ))
@@ -0,0 +1,132 @@
+import datetime
+import random
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.models import UserMaster, FriendRequest, FriendRequestArchive
+from api.friends.serializers import PendingRequestsProjection
+from api.friends.services import archive_requests
+from benchmarks.management.commands.generate_graph import GRAPH_EMAIL_DOMAIN
+from benchmarks.stats import summarize
+
+ANSWERED_STATUSES = ("accepted", "rejected", "cancelled", "expired")
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the pending-request lookups of the hot paths on a friend_requests table padded with "
+        "--history old answered requests, then archives them with archive_requests and times the "
+        "same lookups again. Runs on the graph made by generate_graph. Use --history 50000000 on PostgreSQL "
+        "for the production-sized case."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--history", type=int, default=1_000_000, help="Answered requests to have in the table")
+        parser.add_argument("--queries", type=int, default=500, help="Lookups timed per query shape")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=11)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user_ids = list(
+            UserMaster.objects.filter(email__endswith="@" + GRAPH_EMAIL_DOMAIN).values_list("id", flat=True)
+        )
+        if not user_ids:
+            raise CommandError("No generated graph found, run generate_graph first")
+
+        cutoff = timezone.now() - datetime.timedelta(days=getattr(settings, "FRIEND_REQUEST_ARCHIVE_DAYS", 90))
+        self.populate(options["history"], cutoff, user_ids, rng, options["batch_size"])
+        samples = [(rng.choice(user_ids), rng.choice(user_ids)) for _ in range(options["queries"])]
+
+        before = self.measure(samples)
+        self.report("before archiving", before)
+
+        started = time.perf_counter()
+        moved = sum(count for _, count in archive_requests(cutoff, batch_size=options["batch_size"]))
+        self.stdout.write("archived %d requests in %.1f s" % (moved, time.perf_counter() - started))
+        self.analyze()
+
+        after = self.measure(samples)
+        self.report("after archiving", after)
+
+    def populate(self, total, cutoff, user_ids, rng, batch_size):
+        existing = FriendRequest.objects.exclude(status="pending").filter(updated_on__lt=cutoff).count()
+        started = time.perf_counter()
+        for offset in range(existing, total, batch_size):
+            rows = FriendRequest.objects.bulk_create([
+                FriendRequest(
+                    sent_by_id=rng.choice(user_ids), sent_to_id=rng.choice(user_ids),
+                    status=rng.choice(ANSWERED_STATUSES),
+                )
+                for _ in range(min(batch_size, total - offset))
+            ], batch_size=batch_size)
+            # created_on and updated_on are set on insert, so backdate them with one UPDATE per batch
+            FriendRequest.objects.filter(id__gte=rows[0].id, id__lte=rows[-1].id).update(
+                created_on=cutoff - datetime.timedelta(days=30), updated_on=cutoff - datetime.timedelta(days=1),
+            )
+        if total > existing:
+            self.stdout.write("inserted %d answered requests in %.1f s" % (total - existing, time.perf_counter() - started))
+        self.analyze()
+
+    def measure(self, samples):
+        pending = FriendRequest.objects.filter(status="pending")
+        shapes = {
+            # Inbox page of ViewPendingRequests
+            "inbox_page": lambda user_id, other_id: list(PendingRequestsProjection.project(
+                pending.filter(sent_to_id=user_id)).order_by("-created_on", "-id")[:11]),
+            # Duplicate check of the send path
+            "pending_between": lambda user_id, other_id: pending.filter(
+                sent_by_id=user_id, sent_to_id=other_id).exists(),
+            # Requests a user is waiting on, newest first
+            "sent_pending": lambda user_id, other_id: list(
+                pending.filter(sent_by_id=user_id).order_by("-created_on").values_list("id", flat=True)[:10]),
+        }
+        results = {"rows": FriendRequest.objects.count(), "size_bytes": self.table_size()}
+        for name, lookup in shapes.items():
+            timings = []
+            for user_id, other_id in samples:
+                started = time.perf_counter()
+                lookup(user_id, other_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = summarize(timings)
+        return results
+
+    def report(self, label, results):
+        size = results["size_bytes"]
+        self.stdout.write(self.style.MIGRATE_HEADING("%s: %d rows in friend_requests, %s with indexes" % (
+            label, results["rows"], "%.1f MB" % (size / 1e6) if size is not None else "size unknown",
+        )))
+        for name, summary in results.items():
+            if isinstance(summary, dict):
+                self.stdout.write("  %-16s p50=%7.3f ms  p95=%7.3f ms  p99=%7.3f ms" % (
+                    name, summary["p50_ms"], summary["p95_ms"], summary["p99_ms"],
+                ))
+
+    @staticmethod
+    def table_size():
+        """ Bytes used by friend_requests and its indexes """
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_total_relation_size(%s)", [FriendRequest._meta.db_table])
+                return cursor.fetchone()[0]
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute(
+                        "SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                        [FriendRequest._meta.db_table],
+                    )
+                except Exception:
+                    return None  # SQLite built without the dbstat table
+                return cursor.fetchone()[0]
+        return None
+
+    @staticmethod
+    def analyze():
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("VACUUM ANALYZE %s" % FriendRequest._meta.db_table)
+                cursor.execute("ANALYZE %s" % FriendRequestArchive._meta.db_table)
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
@@ -0,0 +1,73 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from socialnetwork.renderers import ORJSONRenderer, RawJSON
+from socialnetwork.projections import format_timestamps
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders friend list envelopes of increasing size with DRF's JSONRenderer, the orjson renderer, "
+        "and the orjson renderer splicing a pre-encoded page, checks the outputs are identical and "
+        "reports the time per response"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Rows per response")
+        parser.add_argument("--repeat", type=int, default=200, help="Renders per measurement")
+
+    def handle(self, *args, **options):
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        for size in options["sizes"]:
+            rows = self.friend_rows(size)
+            envelope = self.envelope(rows, size)
+            encoded_rows = fast.render(rows)  # e.g. a page kept in the cache
+
+            cases = (
+                ("json (stdlib)", lambda: stdlib.render(envelope)),
+                ("orjson", lambda: fast.render(envelope)),
+                ("orjson + pre-encoded data", lambda: fast.render(self.envelope(RawJSON(encoded_rows), size))),
+            )
+            expected = cases[0][1]()
+            if any(render() != expected for _, render in cases[1:]):
+                raise CommandError("Rendered output differs for %d rows" % size)
+
+            self.stdout.write(self.style.MIGRATE_HEADING("%d rows (%d bytes)" % (size, len(expected))))
+            baseline = None
+            for label, render in cases:
+                started = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    render()
+                elapsed = (time.perf_counter() - started) / options["repeat"] * 1000
+                baseline = baseline or elapsed
+                self.stdout.write("  %-26s %8.3f ms/response  x%.1f" % (label, elapsed, baseline / elapsed))
+
+    @staticmethod
+    def friend_rows(size):
+        since = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        timestamps = format_timestamps([since + datetime.timedelta(minutes=number) for number in range(size)])
+        return [
+            {
+                "id": number + 1,
+                "sent_by_id": number + 1000,
+                "sender_name": "Friend Nümber %d" % number,
+                "sender_email": "friend%d@example.com" % number,
+                "friends_since": timestamps[number],
+            }
+            for number in range(size)
+        ]
+
+    @staticmethod
+    def envelope(data, page_size):
+        # Same shape as SocialNetworkCursorPaginationClass.get_paginated_response
+        return {
+            "status": True,
+            "status_code": 200,
+            "message": "",
+            "error": "",
+            "links": {"next": "http://testserver/api/view_friends/?cursor=eyJwIjpbXX0%3D", "previous": None},
+            "count": None,
+            "page_size": page_size,
+            "data": data,
+        }
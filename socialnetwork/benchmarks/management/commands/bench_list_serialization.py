@@ -0,0 +1,70 @@
+import time
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from rest_framework.renderers import JSONRenderer
+from api.models import UserMaster, FriendRequest, Friendship
+from api.friends.services import add_friendships
+from api.friends.serializers import (
+    ViewPendingRequestsSerializer, PendingRequestsProjection, ViewFriendsSerializer, FriendsProjection
+)
+
+BENCH_EMAIL_DOMAIN = "bench-serialization.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the per-row cost of the pending requests and friends list serializers against "
+        "their .values() projections, and checks that both render byte-identical JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100, help="Rows per page (the list endpoints cap at 100)")
+        parser.add_argument("--repeat", type=int, default=200, help="Pages serialized per measurement")
+
+    def handle(self, *args, **options):
+        owner = self.bench_data(options["rows"])
+        renderer = JSONRenderer()
+        cases = (
+            ("pending_requests",
+             FriendRequest.objects.filter(sent_to=owner, status="pending").order_by("-created_on", "-id"),
+             lambda queryset: ViewPendingRequestsSerializer(queryset.select_related("sent_by"), many=True).data,
+             lambda queryset: PendingRequestsProjection(list(PendingRequestsProjection.project(queryset))).data),
+            ("view_friends",
+             Friendship.objects.filter(user=owner).order_by("-since", "-id"),
+             lambda queryset: ViewFriendsSerializer(queryset.select_related("friend"), many=True).data,
+             lambda queryset: FriendsProjection(list(FriendsProjection.project(queryset))).data),
+        )
+
+        for name, queryset, serializer, projection in cases:
+            page = queryset[:options["rows"]]
+            if renderer.render(serializer(page)) != renderer.render(projection(page)):
+                raise CommandError("%s: projection output differs from the serializer" % name)
+
+            self.stdout.write(self.style.MIGRATE_HEADING("%s (%d rows/page)" % (name, options["rows"])))
+            for label, build in (("serializer", serializer), ("projection", projection)):
+                started = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    renderer.render(build(page))
+                per_row = (time.perf_counter() - started) / (options["repeat"] * options["rows"]) * 1e6
+                self.stdout.write("  %-10s %.2f us/row (query + serialization + rendering)" % (label, per_row))
+
+    def bench_data(self, rows):
+        owner, _ = UserMaster.objects.get_or_create(
+            email="owner@%s" % BENCH_EMAIL_DOMAIN,
+            defaults={"name": "Bench Owner", "password": make_password(None), "role": "Write"},
+        )
+        existing = UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).exclude(id=owner.id).count()
+        UserMaster.objects.bulk_create([
+            UserMaster(name="Bench User %d" % number, email="user%d@%s" % (number, BENCH_EMAIL_DOMAIN),
+                       password=make_password(None))
+            for number in range(existing, rows * 2)
+        ])
+        others = list(UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).exclude(id=owner.id)
+                      .order_by("id").values_list("id", flat=True)[:rows * 2])
+
+        FriendRequest.objects.filter(sent_to=owner).delete()
+        Friendship.objects.filter(Q(user=owner) | Q(friend=owner)).delete()
+        FriendRequest.objects.bulk_create([FriendRequest(sent_by_id=other, sent_to=owner) for other in others[:rows]])
+        add_friendships([(owner.id, other) for other in others[rows:]])
+        return owner
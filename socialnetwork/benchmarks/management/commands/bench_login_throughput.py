@@ -0,0 +1,104 @@
+import copy
+import random
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from api.models import UserMaster
+from socialnetwork import hashing
+from socialnetwork.tokens import get_access_token
+
+BENCH_EMAIL_DOMAIN = "bench-login.invalid"
+BENCH_PASSWORD = "bench-password-1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs mixed login/read traffic on request threads, first with password hashing inline on the "
+        "request thread, then on the hashing pool, and reports latency and throughput of both"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent request threads")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+        parser.add_argument("--login-ratio", type=float, default=0.3, help="Share of requests that are logins")
+        parser.add_argument("--pool-workers", type=int, default=getattr(settings, "PASSWORD_HASHING_WORKERS", 4))
+        parser.add_argument("--pool-queue", type=int, default=getattr(settings, "PASSWORD_HASHING_MAX_QUEUE", 64))
+
+    def handle(self, *args, **options):
+        users = self.bench_users(options["threads"])
+        # Rate limits would turn the benchmark into a throttling test
+        rest_framework = copy.deepcopy(settings.REST_FRAMEWORK)
+        rest_framework["DEFAULT_THROTTLE_RATES"] = {scope: None for scope in rest_framework.get("DEFAULT_THROTTLE_RATES", {})}
+
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for label, workers in (("inline hashing", 0), ("hashing pool", options["pool_workers"])):
+                hashing._pool = hashing.PasswordHashingPool(workers=workers, max_queue=options["pool_queue"], timeout=30)
+                self.report(label, self.run(users, options))
+        hashing._pool = None
+
+    def bench_users(self, count):
+        encoded = make_password(BENCH_PASSWORD)
+        users = []
+        for number in range(count):
+            user, _ = UserMaster.objects.get_or_create(
+                email="user%d@%s" % (number, BENCH_EMAIL_DOMAIN),
+                defaults={"name": "Bench User %d" % number, "password": encoded, "role": "Read"},
+            )
+            users.append(user)
+        return users
+
+    def run(self, users, options):
+        deadline = time.perf_counter() + options["duration"]
+        results = {"login": [], "read": [], "errors": 0}
+        lock = threading.Lock()
+
+        def worker(user, seed):
+            rng = random.Random(seed)
+            client = Client()
+            auth = {"HTTP_AUTHORIZATION": "Bearer " + get_access_token(user)}
+            local = {"login": [], "read": [], "errors": 0}
+            while time.perf_counter() < deadline:
+                kind = "login" if rng.random() < options["login_ratio"] else "read"
+                started = time.perf_counter()
+                if kind == "login":
+                    response = client.post(
+                        "/api/login/", {"email": user.email, "password": BENCH_PASSWORD}, content_type="application/json"
+                    )
+                else:
+                    response = client.get("/api/pending_requests/", **auth)
+                local[kind].append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    local["errors"] += 1
+            connection.close()
+            with lock:
+                results["login"].extend(local["login"])
+                results["read"].extend(local["read"])
+                results["errors"] += local["errors"]
+
+        threads = [threading.Thread(target=worker, args=(user, index)) for index, user in enumerate(users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results["elapsed"] = time.perf_counter() - started
+        return results
+
+    def report(self, label, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        total = len(results["login"]) + len(results["read"])
+        self.stdout.write("  throughput: %.1f req/s  errors: %d" % (total / results["elapsed"], results["errors"]))
+        for kind in ("login", "read"):
+            timings = sorted(results[kind])
+            if not timings:
+                continue
+            self.stdout.write("  %-5s n=%-6d p50=%.1f ms  p95=%.1f ms  p99=%.1f ms" % (
+                kind, len(timings), statistics.median(timings),
+                timings[max(int(len(timings) * 0.95) - 1, 0)], timings[max(int(len(timings) * 0.99) - 1, 0)],
+            ))
+        self.stdout.write("  pool: %s" % hashing.get_hashing_pool().stats())
@@ -0,0 +1,131 @@
+import asyncio
+import resource
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.models import UserMaster
+from benchmarks.stats import summarize
+from socialnetwork.asgi import application
+from socialnetwork.pubsub import get_pubsub, publish_event
+from socialnetwork.tokens import get_access_token
+from socialnetwork.websockets import NOTIFICATIONS_PATH
+
+
+class Connection:
+    """ In-memory ASGI WebSocket client: feeds receive() and records what the server sends """
+
+    def __init__(self, token, stats):
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.stats = stats
+        scope = {
+            "type": "websocket", "path": NOTIFICATIONS_PATH, "query_string": b"",
+            "headers": [(b"authorization", b"Bearer " + token.encode())],
+        }
+        self.task = asyncio.ensure_future(application(scope, self.incoming.get, self.send))
+
+    async def send(self, message):
+        self.stats.record(message)
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+
+class Stats:
+    def __init__(self):
+        self.accepted = self.delivered = self.closed = 0
+        self.round_started = 0.0
+        self.latencies = []
+        self.waiters = []  # (attribute, target, future)
+
+    def record(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted += 1
+        elif message["type"] == "websocket.send":
+            self.delivered += 1
+            self.latencies.append((time.perf_counter() - self.round_started) * 1000)
+        else:
+            self.closed += 1
+        for waiter in list(self.waiters):
+            attribute, target, future = waiter
+            if getattr(self, attribute) >= target and not future.done():
+                future.set_result(None)
+                self.waiters.remove(waiter)
+
+    async def wait_for(self, attribute, target, timeout):
+        if getattr(self, attribute) >= target:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((attribute, target, future))
+        await asyncio.wait_for(future, timeout)
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens --connections WebSocket connections to /ws/notifications/ in one process, spread over "
+        "--users users, through the ASGI application itself with in-memory transports. Then it publishes "
+        "one friend request event to every user per round from a worker thread, like the sync write views, "
+        "and reports connect time, memory per connection and delivery latency and throughput. Uses the "
+        "SOCIALNETWORK_PUBSUB_BACKEND of the settings, so point it at Redis to include the Redis round trip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=2_000, help="Users the connections are spread over")
+        parser.add_argument("--rounds", type=int, default=5, help="Events published to every user")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for a round to arrive")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["connections"] < options["users"]:
+            raise CommandError("--connections must be at least --users, and --users at least 1")
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        connections, users, timeout = options["connections"], options["users"], options["timeout"]
+        self.stdout.write("pub/sub backend: %s" % settings.SOCIALNETWORK_PUBSUB_BACKEND)
+        # Tokens only need the claims, the users are never saved
+        tokens = [get_access_token(UserMaster(id=user_id, name="Fan-out %d" % user_id, role="Read"))
+                  for user_id in range(1, users + 1)]
+
+        stats = Stats()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        clients = [Connection(tokens[number % users], stats) for number in range(connections)]
+        await stats.wait_for("accepted", connections, timeout)
+        elapsed = time.perf_counter() - started
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write("connected %d in %.2f s (%.0f/s), %d subscriptions, ~%.1f KB peak RSS per connection" % (
+            connections, elapsed, connections / elapsed, get_pubsub().subscriber_count(),
+            (rss_after - rss_before) / connections,  # ru_maxrss is in KB on Linux
+        ))
+
+        loop = asyncio.get_running_loop()
+        user_ids = range(1, users + 1)
+        round_times, publish_times = [], []
+        for number in range(1, options["rounds"] + 1):
+            stats.round_started = time.perf_counter()
+            await loop.run_in_executor(None, lambda: [
+                publish_event([user_id], "friend_request.received", request_id=number, user={"id": 0, "name": "bench"})
+                for user_id in user_ids
+            ])
+            publish_times.append((time.perf_counter() - stats.round_started) * 1000)
+            await stats.wait_for("delivered", connections * number, timeout)
+            round_times.append((time.perf_counter() - stats.round_started) * 1000)
+
+        latency = summarize(stats.latencies)
+        total_ms = sum(round_times)
+        self.stdout.write("published %d events per round in p50 %.1f ms" % (users, sorted(publish_times)[len(publish_times) // 2]))
+        self.stdout.write("delivered %d messages, %.0f messages/s" % (stats.delivered, stats.delivered / (total_ms / 1000)))
+        self.stdout.write("round (publish to last delivery)  p50=%8.1f ms  max=%8.1f ms" % (
+            sorted(round_times)[len(round_times) // 2], max(round_times),
+        ))
+        self.stdout.write("delivery latency                  p50=%8.1f ms  p95=%8.1f ms  p99=%8.1f ms" % (
+            latency["p50_ms"], latency["p95_ms"], latency["p99_ms"],
+        ))
+
+        for client in clients:
+            client.disconnect()
+        await asyncio.gather(*(client.task for client in clients))
+        self.stdout.write("disconnected, %d subscriptions left, %d closed by the server" % (
+            get_pubsub().subscriber_count(), stats.closed,
+        ))
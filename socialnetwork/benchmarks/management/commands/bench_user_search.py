@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.models import UserMaster
+from api.users.search import search_users
+
+BENCH_EMAIL_DOMAIN = "bench-search.invalid"
+SYLLABLES = ["ka", "ri", "to", "ma", "ne", "lo", "sa", "vi", "an", "de", "ru", "pe", "li", "mo", "ya", "zu"]
+
+
+class Command(BaseCommand):
+    help = "Benchmarks FindUsers search (trigram index on PostgreSQL, LIKE fallback elsewhere) on synthetic users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000, help="Synthetic users to have in the table")
+        parser.add_argument("--queries", type=int, default=200, help="Searches to time")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic users afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.populate(options["users"], options["batch_size"], rng)
+
+        terms = [self.random_name(rng)[:rng.randint(3, 6)] for _ in range(options["queries"])]
+        page_size = options["page_size"]
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            list(search_users(UserMaster.objects.all(), term).order_by("-rank", "-id").values_list("id", flat=True)[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        self.stdout.write("backend: %s" % connection.vendor)
+        self.stdout.write("queries: %d  p50: %.2f ms  p95: %.2f ms  p99: %.2f ms  max: %.2f ms" % (
+            len(timings),
+            statistics.median(timings),
+            timings[int(len(timings) * 0.95) - 1],
+            timings[int(len(timings) * 0.99) - 1],
+            timings[-1],
+        ))
+        if connection.vendor == "postgresql":
+            plan = search_users(UserMaster.objects.all(), terms[0]).order_by("-rank", "-id")[:page_size].explain(analyze=True)
+            self.stdout.write(plan)
+
+        if options["cleanup"]:
+            deleted, _ = UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).delete()
+            self.stdout.write("removed %d synthetic users" % deleted)
+
+    def populate(self, total, batch_size, rng):
+        existing = UserMaster.objects.filter(email__endswith="@" + BENCH_EMAIL_DOMAIN).count()
+        started = time.perf_counter()
+        for offset in range(existing, total, batch_size):
+            batch = [
+                UserMaster(
+                    name=self.random_name(rng),
+                    email="user%d@%s" % (number, BENCH_EMAIL_DOMAIN),
+                    password="!",  # Unusable password, the benchmark never logs in
+                )
+                for number in range(offset, min(offset + batch_size, total))
+            ]
+            UserMaster.objects.bulk_create(batch, batch_size=batch_size)
+        if total > existing:
+            self.stdout.write("inserted %d users in %.1f s" % (total - existing, time.perf_counter() - started))
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE user_master")
+
+    @staticmethod
+    def random_name(rng):
+        first = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        last = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        return ("%s %s" % (first, last)).title()
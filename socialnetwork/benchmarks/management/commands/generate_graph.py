@@ -0,0 +1,162 @@
+import datetime
+import itertools
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import UserMaster, FriendRequest, Friendship, BlockedUser
+
+GRAPH_EMAIL_DOMAIN = "bench-graph.invalid"
+GRAPH_PASSWORD = "bench-password-1"
+SYLLABLES = ["ka", "ri", "to", "ma", "ne", "lo", "sa", "vi", "an", "de", "ru", "pe", "li", "mo", "ya", "zu"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a synthetic social graph for the benchmarks: users, friendships with a power-law degree "
+        "distribution (Chung-Lu model), pending friend requests and blocks, all written with bulk inserts. "
+        "Every user's password is %r." % GRAPH_PASSWORD
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--avg-degree", type=float, default=20.0, help="Average number of friends per user")
+        parser.add_argument("--exponent", type=float, default=2.5, help="Power-law exponent of the friend degree")
+        parser.add_argument("--pending", type=float, default=3.0, help="Average pending requests received per user")
+        parser.add_argument("--blocks", type=float, default=0.2, help="Average users blocked per user")
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true", help="Delete a previously generated graph first")
+        parser.add_argument("--no-suggestions", action="store_true", help="Skip compute_friend_suggestions")
+
+    def handle(self, *args, **options):
+        if options["exponent"] <= 2:
+            raise CommandError("--exponent must be greater than 2 for the average degree to be finite")
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        existing = UserMaster.objects.filter(email__endswith="@" + GRAPH_EMAIL_DOMAIN)
+        if existing.exists():
+            if not options["clear"]:
+                raise CommandError("A generated graph already exists, pass --clear to replace it")
+            self.step("Deleted previous graph", lambda: existing.delete())
+
+        user_ids = self.step("Created %d users" % options["users"], lambda: self.create_users(options["users"], rng, batch_size))
+        weights = self.degree_weights(len(user_ids), options["exponent"])
+        cum_weights = list(itertools.accumulate(weights))
+
+        friendships = self.step("Created friendships", lambda: self.create_friendships(
+            user_ids, cum_weights, options["avg_degree"], rng, batch_size,
+        ))
+        self.step("Created pending requests", lambda: self.create_pending_requests(
+            user_ids, cum_weights, friendships, options["pending"], rng, batch_size,
+        ))
+        self.step("Created blocks", lambda: self.create_blocks(user_ids, friendships, options["blocks"], rng, batch_size))
+
+        degrees = sorted((count for count in self.degree_counts(friendships).values()), reverse=True)
+        self.stdout.write("friend degree: max %d, median %d, users without friends %d" % (
+            degrees[0] if degrees else 0, degrees[len(degrees) // 2] if degrees else 0, len(user_ids) - len(degrees),
+        ))
+        # Bulk inserts bypass the counter updates of the write paths
+        call_command("reconcile_counters", batch_size=batch_size, stdout=self.stdout)
+        if not options["no_suggestions"]:
+            call_command("compute_friend_suggestions", stdout=self.stdout)
+
+    def step(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write("%s in %.1f s" % (label, time.perf_counter() - started))
+        return result
+
+    def create_users(self, count, rng, batch_size):
+        encoded = make_password(GRAPH_PASSWORD)  # Hashed once, every user shares it
+        for start in range(0, count, batch_size):
+            UserMaster.objects.bulk_create([
+                UserMaster(
+                    name="%s %s" % (self.random_word(rng).title(), self.random_word(rng).title()),
+                    email="user%d@%s" % (number, GRAPH_EMAIL_DOMAIN),
+                    password=encoded,
+                    role="Write" if rng.random() < 0.9 else "Read",
+                )
+                for number in range(start, min(start + batch_size, count))
+            ], batch_size=batch_size)
+        return list(
+            UserMaster.objects.filter(email__endswith="@" + GRAPH_EMAIL_DOMAIN).order_by("id").values_list("id", flat=True)
+        )
+
+    @staticmethod
+    def degree_weights(count, exponent):
+        # Expected degree of user i is proportional to (i + 1) ** (-1 / (exponent - 1)),
+        # which gives a degree distribution with tail P(k) ~ k ** -exponent
+        return [(index + 1) ** (-1.0 / (exponent - 1)) for index in range(count)]
+
+    def create_friendships(self, user_ids, cum_weights, avg_degree, rng, batch_size):
+        target = int(len(user_ids) * avg_degree / 2)
+        pairs = set()
+        attempts = 0
+        while len(pairs) < target and attempts < target * 3:
+            chunk = min(batch_size, target - len(pairs))
+            firsts = rng.choices(user_ids, cum_weights=cum_weights, k=chunk)
+            seconds = rng.choices(user_ids, cum_weights=cum_weights, k=chunk)
+            pairs.update((min(a, b), max(a, b)) for a, b in zip(firsts, seconds) if a != b)
+            attempts += chunk
+
+        now = timezone.now()
+        edges = []
+        for user_id, friend_id in pairs:
+            since = now - datetime.timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            edges.append(Friendship(user_id=user_id, friend_id=friend_id, since=since))
+            edges.append(Friendship(user_id=friend_id, friend_id=user_id, since=since))
+        for start in range(0, len(edges), batch_size):
+            with transaction.atomic():
+                Friendship.objects.bulk_create(edges[start:start + batch_size], ignore_conflicts=True)
+        return pairs
+
+    def create_pending_requests(self, user_ids, cum_weights, friendships, per_user, rng, batch_size):
+        target = int(len(user_ids) * per_user)
+        seen = set()
+        requests = []
+        for _ in range(target * 2):
+            if len(requests) >= target:
+                break
+            # Popular users receive more requests
+            sender = rng.choice(user_ids)
+            recipient = rng.choices(user_ids, cum_weights=cum_weights)[0]
+            pair = (min(sender, recipient), max(sender, recipient))
+            if sender == recipient or pair in friendships or pair in seen:
+                continue
+            seen.add(pair)
+            requests.append(FriendRequest(sent_by_id=sender, sent_to_id=recipient, status="pending"))
+        FriendRequest.objects.bulk_create(requests, batch_size=batch_size)
+        return len(requests)
+
+    def create_blocks(self, user_ids, friendships, per_user, rng, batch_size):
+        target = int(len(user_ids) * per_user)
+        seen = set()
+        blocks = []
+        for _ in range(target * 2):
+            if len(blocks) >= target:
+                break
+            blocked_by, blocked_user = rng.choice(user_ids), rng.choice(user_ids)
+            pair = (min(blocked_by, blocked_user), max(blocked_by, blocked_user))
+            if blocked_by == blocked_user or pair in friendships or pair in seen:
+                continue
+            seen.add(pair)
+            blocks.append(BlockedUser(blocked_by_id=blocked_by, blocked_user_id=blocked_user))
+        BlockedUser.objects.bulk_create(blocks, batch_size=batch_size)
+        return len(blocks)
+
+    @staticmethod
+    def degree_counts(friendships):
+        counts = {}
+        for user_id, friend_id in friendships:
+            counts[user_id] = counts.get(user_id, 0) + 1
+            counts[friend_id] = counts.get(friend_id, 0) + 1
+        return counts
+
+    @staticmethod
+    def random_word(rng):
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
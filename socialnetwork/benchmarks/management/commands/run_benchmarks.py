@@ -0,0 +1,296 @@
+import copy
+import json
+import random
+import subprocess
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+from api.models import UserMaster, FriendRequest, Friendship, BlockedUser
+from api.urls import router
+from benchmarks.management.commands.generate_graph import GRAPH_EMAIL_DOMAIN, GRAPH_PASSWORD
+from benchmarks.stats import summarize
+from socialnetwork.tokens import get_access_token
+
+# Routes that are slow by design (password hashing, whole graph export) run --password-requests times
+SLOW_ROUTES = ("signup", "login", "admin_export")
+
+# Most SQL statements a single request of these routes may run; the run fails when one is exceeded
+QUERY_BUDGETS = {
+    "send_request": 2,  # The guarded INSERT, then the counter UPDATE or the query explaining a failure
+}
+
+
+class QueryCounter:
+    """ ``connection.execute_wrapper`` that counts the statements run by a request """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every route in api/urls.py in-process against the graph made by generate_graph and reports "
+        "p50/p95/p99 latency, queries per request and throughput per route. Use --json to keep the results "
+        "for comparing commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+        parser.add_argument(
+            "--password-requests", type=int, default=20, help="Requests for signup, login and the whole graph export",
+        )
+        parser.add_argument("--routes", nargs="+", help="Only run these routes")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per route")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--keep-cache", action="store_true", help="Do not clear the cache before the run")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.user_ids = list(
+            UserMaster.objects.filter(email__endswith="@" + GRAPH_EMAIL_DOMAIN, email__startswith="user")
+            .order_by("id").values_list("id", flat=True)
+        )
+        if not self.user_ids:
+            raise CommandError("No generated graph found, run generate_graph first")
+        self.tokens = {}
+
+        routes = self.routes()
+        uncovered = self.registered_routes() - {route.split("?")[0] for _, route, _ in routes}
+        if uncovered:
+            raise CommandError("No benchmark scenario for: %s" % ", ".join(sorted(uncovered)))
+        if options["routes"]:
+            routes = [route for route in routes if route[0] in options["routes"]]
+        if not options["keep_cache"]:
+            cache.clear()
+
+        # Rate limits would turn the benchmark into a throttling test
+        rest_framework = copy.deepcopy(settings.REST_FRAMEWORK)
+        rest_framework["DEFAULT_THROTTLE_RATES"] = {scope: None for scope in rest_framework.get("DEFAULT_THROTTLE_RATES", {})}
+
+        results = {}
+        started = time.perf_counter()
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for name, _, prepare in routes:
+                count = options["password_requests"] if name in SLOW_ROUTES else options["requests"]
+                results[name] = self.run_route(prepare, count, options["warmup"])
+                self.report(name, results[name])
+        elapsed = time.perf_counter() - started
+
+        total = sum(result["count"] for result in results.values())
+        self.stdout.write("total: %d requests in %.1f s" % (total, elapsed))
+        if options["json_path"]:
+            with open(options["json_path"], "w") as output:
+                json.dump({"meta": self.meta(options, elapsed), "routes": results}, output, indent=2)
+            self.stdout.write("results written to %s" % options["json_path"])
+
+        over_budget = [
+            "%s ran %d queries (budget %d)" % (name, results[name]["max_queries"], budget)
+            for name, budget in QUERY_BUDGETS.items()
+            if name in results and (results[name]["max_queries"] or 0) > budget
+        ]
+        if over_budget:
+            raise CommandError("Query budget exceeded: %s" % "; ".join(over_budget))
+
+    def run_route(self, prepare, count, warmup):
+        client = Client()
+        timings, queries, statuses, skipped = [], [], {}, 0
+        for number in range(warmup + count):
+            spec = prepare()
+            if spec is None:
+                skipped += 1
+                continue
+            user_id, method, path, data, *extra_headers = spec
+            headers = {"HTTP_AUTHORIZATION": "Bearer " + self.token(user_id)} if user_id else {}
+            headers.update(*extra_headers)
+            body = json.dumps(data) if data is not None else ""
+
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                request_started = time.perf_counter()
+                response = client.generic(method, path, body, content_type="application/json", **headers)
+                if response.streaming:
+                    # Streamed bodies are produced while they are read
+                    b"".join(response.streaming_content)
+                elapsed = (time.perf_counter() - request_started) * 1000
+            if number < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(counter.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        result = summarize(timings)
+        result.update({
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            "max_queries": max(queries) if queries else None,
+            "throughput_rps": round(len(timings) / (sum(timings) / 1000), 1) if timings else None,
+            "statuses": statuses,
+            "skipped": skipped,
+        })
+        return result
+
+    def report(self, name, result):
+        if not result["count"]:
+            self.stdout.write("%-24s skipped (no data)" % name)
+            return
+        self.stdout.write(
+            "%-24s n=%-5d p50=%8.2f ms  p95=%8.2f ms  p99=%8.2f ms  queries=%5.1f  %7.1f req/s  %s" % (
+                name, result["count"], result["p50_ms"], result["p95_ms"], result["p99_ms"],
+                result["queries_per_request"], result["throughput_rps"],
+                " ".join("%s:%d" % item for item in sorted(result["statuses"].items())),
+            )
+        )
+
+    def meta(self, options, elapsed):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "users": len(self.user_ids),
+            "friendship_edges": Friendship.objects.count(),
+            "pending_requests": FriendRequest.objects.filter(status="pending").count(),
+            "elapsed_s": round(elapsed, 2),
+            "options": {key: options[key] for key in ("requests", "password_requests", "warmup", "seed", "routes")},
+        }
+
+    @staticmethod
+    def registered_routes():
+        return {"/api/%s/" % prefix for prefix, _, _ in router.registry} | {"/api/profile/"}
+
+    def token(self, user_id):
+        if user_id not in self.tokens:
+            self.tokens[user_id] = get_access_token(UserMaster.objects.get(pk=user_id))
+        return self.tokens[user_id]
+
+    def random_user(self):
+        return self.rng.choice(self.user_ids)
+
+    def random_row(self, queryset, *fields):
+        """ Roughly uniform random row without ORDER BY RANDOM() """
+        last = queryset.order_by("-id").values_list("id", flat=True).first()
+        if last is None:
+            return None
+        row = queryset.filter(id__gte=self.rng.randint(1, last)).order_by("id").values(*fields).first()
+        return row or queryset.order_by("-id").values(*fields).first()
+
+    def routes(self):
+        """ (name, route, prepare) where prepare() returns (user_id, method, path, data[, headers]) or None """
+        pending = FriendRequest.objects.filter(status="pending")
+
+        def list_page(path):
+            return lambda: (self.random_user(), "GET", path, None)
+
+        def search():
+            name = UserMaster.objects.filter(pk=self.random_user()).values_list("name", flat=True).first()
+            return self.random_user(), "GET", "/api/users/?search=%s" % name[:self.rng.randint(3, 6)], None
+
+        def pending_detail():
+            row = self.random_row(pending, "id", "sent_to_id")
+            return row and (row["sent_to_id"], "GET", "/api/pending_requests/%d/" % row["id"], None)
+
+        def respond(path_format, method):
+            def prepare():
+                row = self.random_row(pending, "id", "sent_to_id")
+                return row and (row["sent_to_id"], method, path_format % row["id"], {})
+            return prepare
+
+        def cancel():
+            row = self.random_row(pending, "id", "sent_by_id")
+            return row and (row["sent_by_id"], "DELETE", "/api/cancel_request/%d/" % row["id"], None)
+
+        def bulk_respond(path):
+            def prepare():
+                row = self.random_row(pending, "id", "sent_to_id")
+                if not row:
+                    return None
+                ids = list(pending.filter(sent_to_id=row["sent_to_id"]).values_list("id", flat=True)[:5])
+                return row["sent_to_id"], "POST", path, {"ids": ids}
+            return prepare
+
+        def unfriend():
+            row = self.random_row(Friendship.objects.all(), "user_id", "friend_id")
+            return row and (
+                row["user_id"], "DELETE", "/api/unfriend/%d/" % row["friend_id"], {"friend_id": row["friend_id"]})
+
+        def unblock():
+            row = self.random_row(BlockedUser.objects.all(), "blocked_by_id", "blocked_user_id")
+            return row and (
+                row["blocked_by_id"], "DELETE", "/api/unblock_user/%d/" % row["blocked_user_id"],
+                {"blocked_user_id": row["blocked_user_id"]})
+
+        def admin_export():
+            admin, _ = UserMaster.objects.get_or_create(
+                email="admin@%s" % GRAPH_EMAIL_DOMAIN, defaults={"name": "Bench Admin", "role": "Admin"},
+            )
+            return admin.id, "GET", "/api/admin_export/", None
+
+        def revalidate(prepare_get):
+            # Fetches the page untimed, then times the conditional GET a polling client would send
+            client = Client()
+
+            def prepare():
+                user_id, method, path, data = prepare_get()
+                etag = client.get(path, HTTP_AUTHORIZATION="Bearer " + self.token(user_id)).get("ETag")
+                return user_id, method, path, data, {"HTTP_IF_NONE_MATCH": etag or ""}
+            return prepare
+
+        def profile():
+            return self.random_user(), "GET", "/api/profile/%d/" % self.random_user(), None
+
+        def login():
+            email = UserMaster.objects.filter(pk=self.random_user()).values_list("email", flat=True).first()
+            return None, "POST", "/api/login/", {"email": email, "password": GRAPH_PASSWORD}
+
+        def signup():
+            email = "signup-%s@%s" % (uuid.uuid4().hex[:12], GRAPH_EMAIL_DOMAIN)
+            return None, "POST", "/api/signup/", {
+                "name": "Bench Signup", "email": email, "password": GRAPH_PASSWORD, "confirm_password": GRAPH_PASSWORD,
+            }
+
+        return [
+            ("users", "/api/users/", list_page("/api/users/")),
+            ("users_search", "/api/users/", search),
+            ("profile", "/api/profile/", profile),
+            ("profile_not_modified", "/api/profile/", revalidate(profile)),
+            ("pending_requests", "/api/pending_requests/", list_page("/api/pending_requests/")),
+            ("pending_requests_not_modified", "/api/pending_requests/",
+             revalidate(list_page("/api/pending_requests/"))),
+            ("pending_request_detail", "/api/pending_requests/", pending_detail),
+            ("view_friends", "/api/view_friends/", list_page("/api/view_friends/")),
+            ("view_friends_not_modified", "/api/view_friends/", revalidate(list_page("/api/view_friends/"))),
+            ("suggestions", "/api/suggestions/", list_page("/api/suggestions/")),
+            ("send_request", "/api/send_request/", lambda: (
+                self.random_user(), "POST", "/api/send_request/", {"sent_to": self.random_user()})),
+            ("bulk_send_requests", "/api/bulk_send_requests/", lambda: (
+                self.random_user(), "POST", "/api/bulk_send_requests/",
+                {"ids": [self.random_user() for _ in range(5)]})),
+            ("accept_request", "/api/accept_request/", respond("/api/accept_request/%d/", "PUT")),
+            ("reject_request", "/api/reject_request/", respond("/api/reject_request/%d/", "DELETE")),
+            ("cancel_request", "/api/cancel_request/", cancel),
+            ("bulk_accept_requests", "/api/bulk_accept_requests/", bulk_respond("/api/bulk_accept_requests/")),
+            ("bulk_reject_requests", "/api/bulk_reject_requests/", bulk_respond("/api/bulk_reject_requests/")),
+            ("unfriend", "/api/unfriend/", unfriend),
+            ("block_user", "/api/block_user/", lambda: (
+                self.random_user(), "POST", "/api/block_user/", {"blocked_user": self.random_user()})),
+            ("unblock_user", "/api/unblock_user/", unblock),
+            ("export", "/api/export/", list_page("/api/export/")),
+            ("admin_export", "/api/admin_export/", admin_export),
+            ("login", "/api/login/", login),
+            ("signup", "/api/signup/", signup),
+        ]
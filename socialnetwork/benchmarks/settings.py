@@ -0,0 +1,40 @@
+"""
+Settings profile for running the benchmarks on a laptop without PostgreSQL or Redis:
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py migrate
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py generate_graph --users 10000
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py run_benchmarks --json results.json
+
+Numbers from this profile are for comparing commits with each other, not for capacity planning.
+"""
+import os
+
+from socialnetwork.settings import *  # noqa: F401,F403
+from socialnetwork.settings import BASE_DIR
+
+SECRET_KEY = os.getenv("SECRET_KEY") or "benchmarks-only-secret-key-not-for-production-use"
+DEBUG = False
+ALLOWED_HOSTS = ["*"]
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("BENCHMARK_DB", str(BASE_DIR / "benchmarks.sqlite3")),
+    }
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+    }
+}
+
+SOCIALNETWORK_THROTTLE_BACKEND = "socialnetwork.throttles.LocalMemoryThrottleBackend"
+SOCIALNETWORK_PUBSUB_BACKEND = "socialnetwork.pubsub.LocalMemoryPubSub"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "loggers": {"django.request": {"level": "CRITICAL"}},
+}
@@ -0,0 +1,24 @@
+import math
+import statistics
+
+
+def percentile(ordered, fraction):
+    """ Nearest-rank percentile of an already sorted list """
+    if not ordered:
+        return None
+    return ordered[min(max(math.ceil(len(ordered) * fraction) - 1, 0), len(ordered) - 1)]
+
+
+def summarize(timings_ms):
+    """ Latency summary of a list of request timings in milliseconds """
+    ordered = sorted(timings_ms)
+    if not ordered:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
@@ -0,0 +1,107 @@
+from asgiref.sync import sync_to_async
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from socialnetwork.responses import http_429_response
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's ``APIView`` for endpoints served under ASGI.
+
+    DRF 3.15 dispatches synchronously, so under ASGI every request is pushed through a
+    thread-sensitive ``sync_to_async`` hop. This view runs authentication, permissions
+    and the handler on the event loop and only uses a thread where there is no async API
+    (throttle backends). Handlers may return DRF ``Response`` objects, so the usual
+    ``http_*_response`` envelopes and paginator responses work unchanged.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = ()
+    throttle_message = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated API, same as DRF's APIView
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args, self.kwargs = args, kwargs
+        # ASGI requests arrive with the whole body read, so parsing request.data does not block
+        request = Request(request, parsers=[parser() for parser in self.parser_classes], authenticators=[])
+        self.request = request
+        try:
+            await self.aauthenticate(request)
+            await self.acheck_permissions(request)
+            throttled = await self.acheck_throttles(request)
+            if throttled is not None:
+                return self.finalize_response(throttled)
+
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+        return self.finalize_response(response)
+
+    async def aauthenticate(self, request):
+        request.user, request.auth = None, None
+        self._authenticator = None
+        for authenticator in (auth() for auth in self.authentication_classes):
+            if hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(request)
+            if result is not None:
+                self._authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        for permission in (permission() for permission in self.permission_classes):
+            if hasattr(permission, 'ahas_permission'):
+                allowed = await permission.ahas_permission(request, self)
+            else:
+                allowed = permission.has_permission(request, self)
+            if not allowed:
+                if self._authenticator is None and self.authentication_classes:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(detail=getattr(permission, 'message', None))
+
+    async def acheck_throttles(self, request):
+        for throttle in (throttle() for throttle in self.throttle_classes):
+            if hasattr(throttle, 'applies_to') and not throttle.applies_to(request, self):
+                continue
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                wait = throttle.wait()
+                message = self.throttle_message or str(exceptions.Throttled(wait).detail)
+                return http_429_response(message=message, retry_after=wait)
+        return None
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = [auth() for auth in self.authentication_classes]
+            if authenticators:
+                headers['WWW-Authenticate'] = authenticators[0].authenticate_header(self.request)
+            else:
+                exc.status_code = 403
+        return self.finalize_response(Response({'detail': exc.detail}, status=exc.status_code, headers=headers))
+
+    def finalize_response(self, response):
+        if isinstance(response, Response):
+            renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+            response.accepted_renderer = renderer
+            response.accepted_media_type = renderer.media_type
+            response.renderer_context = {'view': self, 'request': self.request, 'response': response}
+            response.render()
+        return response
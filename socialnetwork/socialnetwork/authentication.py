@@ -0,0 +1,110 @@
+import threading
+import time
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from socialnetwork.tokens import decode_token
+
+# Fields of UserMaster that are filled from the token claims
+CLAIM_FIELDS = (('id', 'user_id'), ('name', 'name'), ('role', 'role'))
+
+
+class UserCache:
+    """ Small in-process cache of fully loaded users, kept for ``AUTH_USER_CACHE_TTL`` seconds """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        from api.models import UserMaster
+
+        ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 30)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        user = UserMaster.objects.get(pk=user_id)
+        with self._lock:
+            if len(self._users) >= getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000):
+                self._users.clear()
+            self._users[user_id] = (now + ttl, user)
+        return user
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+def user_from_claims(claims):
+    """
+    Builds the request user from the token claims without touching the database.
+    Tokens issued before ``role`` was added to the claims fall back to the user cache.
+    """
+    from api.models import AuthenticatedUser
+
+    if not all(claim in claims for _, claim in CLAIM_FIELDS):
+        user = user_cache.get(claims['user_id'])
+        claims = {'user_id': user.id, 'name': user.name, 'role': user.role}
+    return AuthenticatedUser.from_db(
+        'default', [field for field, _ in CLAIM_FIELDS], [claims[claim] for _, claim in CLAIM_FIELDS]
+    )
+
+
+class StatelessJWTAuthentication(BaseAuthentication):
+    """
+    Authenticates ``Authorization: Bearer <access token>`` headers issued by ``socialnetwork.tokens``.
+    The user is rebuilt from the claims; other fields are loaded lazily, see ``AuthenticatedUser``.
+    """
+    keyword = b'bearer'
+
+    def get_claims(self, request):
+        """ Validated access token claims of the request, or None when it carries no bearer token """
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword:
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+
+        try:
+            claims = decode_token(header[1].decode())
+        except jwt.ExpiredSignatureError:
+            raise AuthenticationFailed('Token is invalid or expired')
+        except (jwt.InvalidTokenError, UnicodeError):
+            raise AuthenticationFailed('Given token not valid for any token type')
+
+        if claims.get('token_type') != 'access' or 'user_id' not in claims:
+            raise AuthenticationFailed('Given token not valid for any token type')
+        return claims
+
+    def authenticate(self, request):
+        claims = self.get_claims(request)
+        if claims is None:
+            return None
+        try:
+            return user_from_claims(claims), claims
+        except ObjectDoesNotExist:
+            raise AuthenticationFailed('User not found')
+
+    async def aauthenticate(self, request):
+        # Only tokens without the full claim set need the database, which runs off the event loop
+        claims = self.get_claims(request)
+        if claims is None:
+            return None
+        try:
+            if all(claim in claims for _, claim in CLAIM_FIELDS):
+                return user_from_claims(claims), claims
+            return await sync_to_async(user_from_claims)(claims), claims
+        except ObjectDoesNotExist:
+            raise AuthenticationFailed('User not found')
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
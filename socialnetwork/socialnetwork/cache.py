@@ -0,0 +1,280 @@
+import hashlib
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.http.response import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework_extensions.settings import extensions_api_settings
+from rest_framework_extensions.cache.decorators import CacheResponse
+from rest_framework_extensions.key_constructor import bits
+from rest_framework_extensions.key_constructor.constructors import DefaultKeyConstructor
+from socialnetwork.metrics import CACHE_EVENTS
+
+GENERATION_KEY = "user_generation:%s"
+BLOCK_GENERATION_KEY = "block_generation:%s"  # Moves when a user blocks, unblocks or is (un)blocked
+STATS_KEY = "cache_stats:%s:%s"
+
+
+def _initial_generation():
+    # Start from the clock rather than 0 so an evicted counter can never fall back
+    # to a generation that still has cached entries.
+    return int(time.time() * 1000)
+
+
+def _get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, _initial_generation(), timeout=None):
+            cache.incr(key)
+
+
+def get_user_generation(user_id):
+    """ Returns the current cache generation of a user """
+    return _get_generation(GENERATION_KEY % user_id)
+
+
+async def _aget_generation(key):
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _initial_generation(), timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+
+async def aget_user_generation(user_id):
+    return await _aget_generation(GENERATION_KEY % user_id)
+
+
+def bump_user_generation(*user_ids):
+    """ Invalidates every cached response of the given users by moving them to a new generation """
+    for user_id in {int(user_id) for user_id in user_ids if user_id}:
+        _bump_generation(GENERATION_KEY % user_id)
+
+
+def get_block_generation(user_id):
+    """ Generation of a user's cached block sets, see api.friends.blocks """
+    return _get_generation(BLOCK_GENERATION_KEY % user_id)
+
+
+async def aget_block_generation(user_id):
+    return await _aget_generation(BLOCK_GENERATION_KEY % user_id)
+
+
+def bump_block_generation(*user_ids):
+    for user_id in {int(user_id) for user_id in user_ids if user_id}:
+        _bump_generation(BLOCK_GENERATION_KEY % user_id)
+
+
+def get_generations(keys):
+    """ Several generations in one cache round trip; missing ones are started like ``get_user_generation`` """
+    found = cache.get_many(keys)
+    return [found[key] if key in found else _get_generation(key) for key in keys]
+
+
+async def aget_generations(keys):
+    found = await cache.aget_many(keys)
+    return [found[key] if key in found else await _aget_generation(key) for key in keys]
+
+
+def record_cache_event(endpoint, event):
+    CACHE_EVENTS.inc(endpoint, event)
+    key = STATS_KEY % (endpoint, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+async def arecord_cache_event(endpoint, event):
+    CACHE_EVENTS.inc(endpoint, event)
+    key = STATS_KEY % (endpoint, event)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+def get_cache_stats(endpoint):
+    """ Returns the hit/miss counters of a cached endpoint """
+    stats = cache.get_many([STATS_KEY % (endpoint, "hit"), STATS_KEY % (endpoint, "miss")])
+    return {
+        "hit": stats.get(STATS_KEY % (endpoint, "hit"), 0),
+        "miss": stats.get(STATS_KEY % (endpoint, "miss"), 0),
+    }
+
+
+class UserGenerationKeyBit(bits.KeyBitBase):
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return get_user_generation(request.user.id)
+
+
+class UserListKeyConstructor(DefaultKeyConstructor):
+    """ Cache key scoped to the user, their current generation and the query string """
+    user = bits.UserKeyBit()
+    generation = UserGenerationKeyBit()
+    query_params = bits.QueryParamsKeyBit()
+
+
+class UserCacheResponse(CacheResponse):
+    """
+    ``cache_response`` keyed per user generation. Entries can live for a long time because
+    every write that affects a user bumps their generation, which moves reads to a new key.
+    Hits and misses are counted per endpoint.
+    """
+
+    def __init__(self, timeout=None, key_func=None, cache=None, cache_errors=False):
+        super().__init__(
+            timeout=timeout,
+            key_func=key_func or UserListKeyConstructor(),
+            cache=cache,
+            cache_errors=cache_errors,
+        )
+
+    def process_cache_response(self, view_instance, view_method, request, args, kwargs):
+        endpoint = view_instance.__class__.__name__
+        key = self.calculate_key(
+            view_instance=view_instance,
+            view_method=view_method,
+            request=request,
+            args=args,
+            kwargs=kwargs
+        )
+        timeout = self.calculate_timeout(view_instance=view_instance)
+
+        response_triple = self.cache.get(key)
+        if response_triple:
+            record_cache_event(endpoint, "hit")
+            content, status, headers = response_triple
+            response = HttpResponse(content=content, status=status)
+            for k, v in headers.values():
+                response[k] = v
+        else:
+            record_cache_event(endpoint, "miss")
+            response = view_method(view_instance, request, *args, **kwargs)
+            response = view_instance.finalize_response(request, response, *args, **kwargs)
+            response.render()
+            if not response.status_code >= 400 or self.cache_errors:
+                headers = {k: (k, v) for k, v in response.items()}
+                self.cache.set(key, (response.rendered_content, response.status_code, headers), timeout)
+
+        if not hasattr(response, '_closable_objects'):
+            response._closable_objects = []
+        return response
+
+
+cache_user_response = UserCacheResponse
+
+
+def async_cache_user_response(timeout=None):
+    """
+    ``cache_user_response`` for the async views: same per-user generation scheme and hit/miss
+    counters, using the async cache API. Meant for ``AsyncAPIView`` handlers.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def inner(self, request, *args, **kwargs):
+            endpoint = self.__class__.__name__
+            generation = await aget_user_generation(request.user.id)
+            query = hashlib.md5(request.META.get('QUERY_STRING', '').encode('utf-8')).hexdigest()
+            key = "async_response:%s:%s:%s:%s:%s" % (endpoint, request.user.id, generation, query, sorted(kwargs.items()))
+
+            cached = await cache.aget(key)
+            if cached:
+                await arecord_cache_event(endpoint, "hit")
+                content, status, content_type = cached
+                return HttpResponse(content=content, status=status, content_type=content_type)
+
+            await arecord_cache_event(endpoint, "miss")
+            response = self.finalize_response(await func(self, request, *args, **kwargs))
+            if response.status_code < 400:
+                response_timeout = extensions_api_settings.DEFAULT_CACHE_RESPONSE_TIMEOUT if timeout is None else timeout
+                await cache.aset(key, (response.content, response.status_code, response['Content-Type']), response_timeout)
+            return response
+        return inner
+    return decorator
+
+
+def _etag_keys(request, kwargs, other_users):
+    """ Generation keys a response depends on: the user's own and those of ``other_users(kwargs)`` """
+    keys = [GENERATION_KEY % request.user.id]
+    if other_users is not None:
+        keys += [GENERATION_KEY % user_id for user_id in other_users(kwargs)]
+    return keys
+
+
+def _etag(endpoint, request, kwargs, generations):
+    # Weak: the same generations give the same data, not necessarily the same bytes
+    raw = "%s:%s:%s:%s:%s" % (
+        endpoint, request.user.id, generations, request.META.get('QUERY_STRING', ''), sorted(kwargs.items()),
+    )
+    return 'W/"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _not_modified(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
+
+
+def _with_etag(response, etag):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        # Per-user responses: browsers may keep them but must revalidate, shared caches must not store them
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_user_response(other_users=None, version=None):
+    """
+    ETag for a per-user GET, derived from the generations that ``bump_user_generation`` moves on
+    every write affecting the response. A matching ``If-None-Match`` is answered with
+    304 Not Modified from the generations alone, before the view, its cache or any query runs.
+    ``other_users(kwargs)`` names other users whose writes change the response. ``version(request, kwargs)``
+    adds a value that moves when parts of the response no generation covers change. Applied outside
+    ``cache_user_response``.
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(self, request, *args, **kwargs):
+            endpoint = self.__class__.__name__
+            generations = get_generations(_etag_keys(request, kwargs, other_users))
+            if version is not None:
+                generations.append(version(request, kwargs))
+            etag = _etag(endpoint, request, kwargs, generations)
+            if _not_modified(request, etag):
+                record_cache_event(endpoint, "not_modified")
+                return _with_etag(HttpResponseNotModified(), etag)
+            return _with_etag(func(self, request, *args, **kwargs), etag)
+        return inner
+    return decorator
+
+
+def async_conditional_user_response(other_users=None, version=None):
+    """ ``conditional_user_response`` for the ``AsyncAPIView`` handlers; ``version`` is a coroutine function """
+    def decorator(func):
+        @wraps(func)
+        async def inner(self, request, *args, **kwargs):
+            endpoint = self.__class__.__name__
+            generations = await aget_generations(_etag_keys(request, kwargs, other_users))
+            if version is not None:
+                generations.append(await version(request, kwargs))
+            etag = _etag(endpoint, request, kwargs, generations)
+            if _not_modified(request, etag):
+                await arecord_cache_event(endpoint, "not_modified")
+                return _with_etag(HttpResponseNotModified(), etag)
+            return _with_etag(await func(self, request, *args, **kwargs), etag)
+        return inner
+    return decorator
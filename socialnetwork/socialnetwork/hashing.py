@@ -0,0 +1,156 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+
+class HashingPoolFull(Exception):
+    """ Raised when the hashing queue is full; callers should answer 503 instead of waiting """
+
+
+class HashingTimeout(HashingPoolFull):
+    """ Raised when a job waited longer than the pool's timeout; answered with a 503 like a full queue """
+
+
+class PasswordHashingPool:
+    """
+    Bounded worker pool for password hashing.
+
+    PBKDF2 is CPU bound and OpenSSL releases the GIL while it runs, so a few threads can hash
+    in parallel while request workers only wait on a future. At most ``workers`` hashes run
+    at once and at most ``max_queue`` more wait; anything beyond that is rejected right away,
+    so a login storm cannot pile up behind the CPU and starve cheap endpoints.
+    With ``workers=0`` hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, workers, max_queue, timeout):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher") if workers else None
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        try:
+            return self._submit(func, *args).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingTimeout("Password operation timed out") from None
+
+    async def arun(self, func, *args):
+        """ ``run()`` for async views: the event loop awaits the job instead of a thread blocking on it """
+        if self._executor is None:
+            return func(*args)
+        future = self._submit(func, *args)
+        try:
+            # shield(): a timeout stops the wait, not a job that may already be running
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise HashingTimeout("Password operation timed out") from None
+
+    def _submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingPoolFull("Too many password operations in progress")
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self._executor.submit(self._call, func, *args)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        # The slot is held until the job is done, not until the caller stops waiting, so
+        # callers that time out cannot push more than workers + max_queue jobs into the executor
+        future.add_done_callback(lambda future: self._slots.release())
+        return future
+
+    def _call(self, func, *args):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+    def stats(self):
+        """ Queue depth and counters, exported as metrics """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queued,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHashingPool(
+                    workers=getattr(settings, "PASSWORD_HASHING_WORKERS", os.cpu_count() or 1),
+                    max_queue=getattr(settings, "PASSWORD_HASHING_MAX_QUEUE", 64),
+                    timeout=getattr(settings, "PASSWORD_HASHING_TIMEOUT", 10),
+                )
+    return _pool
+
+
+def hash_password(raw_password):
+    """ make_password() on the hashing pool """
+    return get_hashing_pool().run(make_password, raw_password)
+
+
+async def ahash_password(raw_password):
+    """ hash_password() for async views """
+    return await get_hashing_pool().arun(make_password, raw_password)
+
+
+def needs_rehash(encoded):
+    """ True when ``encoded`` was made with another hasher or weaker parameters than the current default """
+    preferred = get_hasher("default")
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def verify_password(user, raw_password):
+    """
+    Checks ``raw_password`` against ``user`` on the hashing pool. When the stored hash uses
+    outdated hasher settings it is transparently replaced with a fresh one.
+    """
+    valid = get_hashing_pool().run(check_password, raw_password, user.password)
+    if valid and needs_rehash(user.password):
+        user.password = hash_password(raw_password)
+        user.save(update_fields=["password"])
+    return valid
+
+
+async def averify_password(user, raw_password):
+    """ verify_password() for async views """
+    valid = await get_hashing_pool().arun(check_password, raw_password, user.password)
+    if valid and needs_rehash(user.password):
+        user.password = await ahash_password(raw_password)
+        await user.asave(update_fields=["password"])
+    return valid
@@ -0,0 +1,159 @@
+import bisect
+import math
+import threading
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        yield "# HELP %s %s" % (self.name, self.documentation)
+        yield "# TYPE %s counter" % self.name
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield "%s%s %s" % (self.name, _labels(self.labelnames, labelvalues), _number(value))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        yield "# HELP %s %s" % (self.name, self.documentation)
+        yield "# TYPE %s histogram" % self.name
+        with self._lock:
+            values = [(labelvalues, (list(counts), total, count)) for labelvalues, (counts, total, count) in self._values.items()]
+        for labelvalues, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "%s_bucket%s %d" % (
+                    self.name, _labels(self.labelnames, labelvalues, [("le", _number(bound))]), cumulative,
+                )
+            yield "%s_sum%s %s" % (self.name, _labels(self.labelnames, labelvalues), _number(total))
+            yield "%s_count%s %d" % (self.name, _labels(self.labelnames, labelvalues), count)
+
+
+class GaugeCallback:
+    """ Gauge whose samples are read from ``callback()`` (a dict of label value -> number) at scrape time """
+
+    def __init__(self, name, documentation, labelname, callback):
+        self.name, self.documentation, self.labelname, self.callback = name, documentation, labelname, callback
+
+    def collect(self):
+        yield "# HELP %s %s" % (self.name, self.documentation)
+        yield "# TYPE %s gauge" % self.name
+        for labelvalue, value in self.callback().items():
+            yield "%s%s %s" % (self.name, _labels((self.labelname,), (labelvalue,)), _number(value))
+
+
+class Registry:
+    """
+    In-process metrics in the Prometheus text format. Every worker process keeps its own
+    values, so scrape each worker (or run one process per container).
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests by route, method and HTTP status", ("route", "method", "status"),
+))
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling the request", ("route", "method"), LATENCY_BUCKETS,
+))
+REQUEST_QUERIES = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements run by the request", ("route", "method"), QUERY_BUCKETS,
+))
+REQUEST_DB_TIME = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements by the request", ("route", "method"), LATENCY_BUCKETS,
+))
+RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Size of the response body", ("route", "method"), SIZE_BUCKETS,
+))
+ENVELOPES = registry.register(Counter(
+    "api_envelope_responses_total", "Responses built by the http_*_response helpers and the paginators, "
+    "by the status_code in the envelope", ("route", "status_code"),
+))
+CACHE_EVENTS = registry.register(Counter(
+    "api_cache_events_total", "Hits, misses and 304 revalidations of the per-user response cache", ("view", "event"),
+))
+
+
+def _hashing_pool_stats():
+    from socialnetwork.hashing import get_hashing_pool
+    return get_hashing_pool().stats()
+
+
+registry.register(GaugeCallback(
+    "password_hashing_pool", "Password hashing pool state (workers, queued, in_flight, completed, rejected)",
+    "stat", _hashing_pool_stats,
+))
+
+
+def metrics_view(request):
+    """ Prometheus scrape endpoint; protected by ``METRICS_TOKEN`` when it is set """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), "Bearer %s" % token):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,114 @@
+import contextvars
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.db.backends.signals import connection_created
+from socialnetwork import metrics
+
+# QueryStats of the request being served; sync_to_async copies the context into the thread
+# the async ORM runs a query on, so queries are counted for the right request there too
+_request_stats = contextvars.ContextVar("request_query_stats", default=None)
+
+
+class QueryStats:
+    """ ``connection.execute_wrapper`` that counts and times the SQL statements of one request """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install_wrapper(sender=None, **kwargs):
+    """ Puts ``_count_query`` on a connection once; runs for every new connection in any thread """
+    wrappers = kwargs["connection"].execute_wrappers
+    if _count_query not in wrappers:
+        # First, not last: connection.execute_wrapper() pops the last wrapper when its block
+        # ends, and connections open lazily inside such blocks
+        wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_install_wrapper)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, SQL query count and time, response size and the envelope outcome of
+    every request, labelled with the URL name of the route. Exposed by ``/metrics``.
+    Works in both sync and async stacks. Queries are counted by a wrapper installed on every
+    connection when it opens and attributed through a context variable, so the async path
+    never has to reach the ORM's threads itself.
+    """
+    sync_capable = True
+    async_capable = True
+    skip_paths = ("/metrics",)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.path in self.skip_paths:
+            return self.get_response(request)
+
+        # The connection may have opened before this module connected the signal
+        _install_wrapper(connection=connection)
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        if request.path in self.skip_paths:
+            return await self.get_response(request)
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, stats):
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else "unmatched"
+        method = request.method
+
+        metrics.REQUESTS.inc(route, method, str(response.status_code))
+        metrics.REQUEST_LATENCY.observe(duration, route, method)
+        metrics.REQUEST_QUERIES.observe(stats.count, route, method)
+        metrics.REQUEST_DB_TIME.observe(stats.duration, route, method)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(len(response.content), route, method)
+
+        # DRF responses keep the data they were rendered from; cached responses do not
+        data = getattr(response, "data", None)
+        if isinstance(data, dict) and "status_code" in data:
+            metrics.ENVELOPES.inc(route, str(data["status_code"]))
@@ -1,6 +1,13 @@
+import binascii
+import inspect
+import json
+from base64 import b64decode, b64encode
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
 class SocialNetworkPaginationClass(PageNumberPagination):
     page_size = 10
@@ -41,4 +48,163 @@ class SocialNetworkPaginationClass(PageNumberPagination):
                 'count': self.page.paginator.count,
                 'page_size':int(limit),
                 "data":data}
-            )
\ No newline at end of file
+            )
+
+
+class SocialNetworkCursorPaginationClass(BasePagination):
+    """
+    Keyset pagination over an ordered queryset.
+
+    Pages are fetched with ``WHERE (ordering fields) < (cursor position) LIMIT page_size + 1``
+    so every page costs the same, however deep the client scrolls. The last ordering field
+    must be unique (normally ``id``) so positions never tie. Counting is opt-in with
+    ``?count=true`` because it is the only part that still grows with the result set;
+    views that keep a denormalized total pass ``counter`` (a callable, sync or async,
+    returning it) and skip the COUNT(*).
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-created_on', '-id')
+    message = ''
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None, *args, counter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if ordering is not None:
+            self.ordering = ordering
+        self.counter = counter
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self._page_queryset(queryset, request)
+        self.count = self.get_count(queryset, request)
+        return self._set_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """ Same as ``paginate_queryset`` for async views, using the async ORM """
+        page = self._page_queryset(queryset, request)
+        self.count = await self.aget_count(queryset, request)
+        return self._set_page([item async for item in page])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering if not self.reverse else [self._invert(field) for field in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self._after(ordering, self.position))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_count(self, queryset, request):
+        if not self.count_requested(request):
+            return None
+        if self.counter is not None:
+            return self.counter()
+        return queryset.count()
+
+    async def aget_count(self, queryset, request):
+        if not self.count_requested(request):
+            return None
+        if self.counter is not None:
+            count = self.counter()
+            return await count if inspect.isawaitable(count) else count
+        return await queryset.acount()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = cursor['p']
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return position, bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse):
+        position = []
+        for field in self.ordering:
+            value = self._get_value(item, field.lstrip('-'))
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        cursor = json.dumps({'p': position, 'r': 1 if reverse else 0}, separators=(',', ':'))
+        encoded = b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        cursor = self.request.query_params.get(self.cursor_query_param)
+        return Response({
+            'status': True,
+            "status_code": 200,
+            "message": "Data not found" if not data and not cursor else self.message,
+            "error": "",
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+            'count': self.count,
+            'page_size': self.page_size,
+            "data": data}
+        )
+
+    def _after(self, ordering, position):
+        """ Builds (f1, f2, ...) > (v1, v2, ...) honouring the direction of every field """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = '%s__lt' % name if field.startswith('-') else '%s__gt' % name
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _get_value(item, name):
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import threading
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "notifications:%s"  # Redis channel of a user's events
+
+
+class Subscription:
+    """
+    Events of one user for one WebSocket connection, queued on the event loop that serves the
+    connection. ``get()`` returns the next event as JSON text, or None once the connection fell
+    more than ``NOTIFICATION_QUEUE_SIZE`` events behind and should be closed.
+    """
+
+    def __init__(self, user_id, loop, max_queue):
+        self.user_id = user_id
+        self.loop = loop
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    def put(self, message):
+        """ Only called on ``self.loop`` """
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.max_queue:
+            self.overflowed = True
+            message = None
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+def _put_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class LocalMemoryPubSub:
+    """
+    In-process fan-out from publishers to the subscriptions of the WebSocket connections.
+    Events only reach connections served by the same process, so on its own it is only suitable
+    for tests and single-process setups.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # user id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, message):
+        """ Delivers a JSON text message to every connection of a user; safe to call from any thread """
+        self.deliver(int(user_id), message)
+
+    def deliver(self, user_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        if not subscriptions:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        by_loop = {}
+        for subscription in subscriptions:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, loop_subscriptions in by_loop.items():
+            if loop is running:
+                _put_all(loop_subscriptions, message)
+            else:
+                # Sync views run in worker threads, the queues live on the connections' event loop;
+                # one wakeup per loop rather than per connection
+                loop.call_soon_threadsafe(_put_all, loop_subscriptions, message)
+
+    def subscribe(self, user_id):
+        """ Called on the event loop serving the connection """
+        subscription = Subscription(
+            int(user_id), asyncio.get_running_loop(), getattr(settings, "NOTIFICATION_QUEUE_SIZE", 100),
+        )
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class RedisPubSub(LocalMemoryPubSub):
+    """
+    Events are PUBLISHed to Redis, one channel per user. Each process keeps a single Redis
+    connection, started with its first WebSocket connection, that is SUBSCRIBEd only to the
+    channels of the users connected to this process: a user's channel is subscribed when their
+    first connection opens and unsubscribed when their last one closes. The events are handed
+    to the in-process fan-out, so neither the Redis connections nor the events a process reads
+    grow with the WebSocket connections served elsewhere.
+    """
+
+    def __init__(self, alias="default"):
+        super().__init__()
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection(alias)
+        self.url = getattr(settings, "SOCIALNETWORK_PUBSUB_REDIS_URL", None) or settings.CACHES[alias]["LOCATION"]
+        self._listener = None
+        self._changes = None  # Users whose channel may need (un)subscribing, read by the listener
+
+    def publish(self, user_id, message):
+        self.client.publish(CHANNEL % int(user_id), message)
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self._listener is None or self._listener.done():
+            self._changes = asyncio.Queue()
+            self._listener = asyncio.get_running_loop().create_task(self.listen())
+        self._changes.put_nowait(subscription.user_id)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        if self._changes is not None:
+            self._changes.put_nowait(subscription.user_id)
+
+    async def listen(self):
+        import redis.asyncio
+
+        while True:
+            try:
+                async with redis.asyncio.Redis.from_url(self.url) as client, client.pubsub() as pubsub:
+                    await pubsub.connect()
+                    # A new connection has no channels yet, every user connected here is subscribed again
+                    with self._lock:
+                        for user_id in self._subscriptions:
+                            self._changes.put_nowait(user_id)
+                    # One task reads the events, the other sends (UN)SUBSCRIBE as users come and go
+                    tasks = [
+                        asyncio.ensure_future(self._receive(pubsub)),
+                        asyncio.ensure_future(self._update_channels(pubsub, set())),
+                    ]
+                    try:
+                        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+                    for task in done:
+                        task.result()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification listener lost its Redis connection, reconnecting")
+                await asyncio.sleep(1)
+
+    async def _receive(self, pubsub):
+        prefix = CHANNEL % ""
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            if message is None or message["type"] != "message":
+                continue
+            user_id = int(message["channel"].decode()[len(prefix):])
+            self.deliver(user_id, message["data"].decode())
+
+    async def _update_channels(self, pubsub, subscribed):
+        """ Brings the connection's channels in line with the connected users, one command per change batch """
+        while True:
+            user_ids = {await self._changes.get()}
+            while not self._changes.empty():
+                user_ids.add(self._changes.get_nowait())
+            with self._lock:
+                connected = {user_id for user_id in user_ids if user_id in self._subscriptions}
+            added, removed = connected - subscribed, (user_ids - connected) & subscribed
+            if added:
+                await pubsub.subscribe(*(CHANNEL % user_id for user_id in added))
+                subscribed |= added
+            if removed:
+                await pubsub.unsubscribe(*(CHANNEL % user_id for user_id in removed))
+                subscribed -= removed
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_pubsub():
+    """ Returns the backend configured in SOCIALNETWORK_PUBSUB_BACKEND """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, "SOCIALNETWORK_PUBSUB_BACKEND", "socialnetwork.pubsub.RedisPubSub")
+                _backend = import_string(path)()
+    return _backend
+
+
+def publish_event(user_ids, event_type, **data):
+    """
+    Pushes ``{"type": event_type, **data}`` to the WebSocket connections of ``user_ids`` once the
+    current transaction commits. A failed publish is logged and never fails the write that
+    caused it; clients resync through the REST endpoints when they reconnect.
+    """
+    user_ids = {int(user_id) for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    message = orjson.dumps({"type": event_type, **data}).decode()
+
+    def publish():
+        backend = get_pubsub()
+        for user_id in user_ids:
+            try:
+                backend.publish(user_id, message)
+            except Exception:
+                logger.exception("Could not publish %s to user %s", event_type, user_id)
+
+    transaction.on_commit(publish)
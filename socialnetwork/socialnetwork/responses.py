@@ -1,5 +1,10 @@
+import math
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import exceptions, status
+from rest_framework.views import exception_handler
+
+# ``data`` may be a socialnetwork.renderers.RawJSON holding already encoded JSON; it is
+# written into the envelope as is by the default renderer.
 
 def http_200_response(message,error="",data=""):
     context={
@@ -45,4 +50,36 @@ def http_400_response(message,error="",data=""):
         "data":data
  
         }
-    return Response(context,status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(context,status=status.HTTP_400_BAD_REQUEST)
+
+
+def http_429_response(message,retry_after=None,error="",data=""):
+    context={
+        "status":False,
+        "status_code":429,
+        "message":message,
+        "error":error,
+        "data":data
+        }
+    headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+    return Response(context,status=status.HTTP_429_TOO_MANY_REQUESTS,headers=headers)
+
+
+def http_503_response(message,retry_after=None,error="",data=""):
+    context={
+        "status":False,
+        "status_code":503,
+        "message":message,
+        "error":error,
+        "data":data
+        }
+    headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+    return Response(context,status=status.HTTP_503_SERVICE_UNAVAILABLE,headers=headers)
+
+
+def social_network_exception_handler(exc, context):
+    """ DRF exception handler that answers throttled requests with the usual envelope """
+    if isinstance(exc, exceptions.Throttled):
+        message = getattr(context.get('view'), 'throttle_message', None) or str(exc.detail)
+        return http_429_response(message=message, retry_after=exc.wait)
+    return exception_handler(exc, context)
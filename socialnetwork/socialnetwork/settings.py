@@ -40,13 +40,16 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "drf_yasg",
-    "api"
+    "api",
+    "benchmarks",
 ]
 
 MIDDLEWARE = [
+    "socialnetwork.middleware.RequestMetricsMiddleware",  # First, so it measures the whole stack
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,6 +92,15 @@ SESSION_CACHE_ALIAS = "default"
 
 
 WSGI_APPLICATION = "socialnetwork.wsgi.application"
+ASGI_APPLICATION = "socialnetwork.asgi.application"
+
+# Serve the read endpoints (pending requests, friends, user search, profiles) with native
+# async views. Only useful when running under an ASGI server such as uvicorn.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "0") == "1"
+
+# Serve Login and SignUp with native async views that await the password hashing pool
+# instead of blocking a request thread on it. Also only useful under an ASGI server.
+ASYNC_AUTH_VIEWS = os.getenv("ASYNC_AUTH_VIEWS", "0") == "1"
 
 
 # Database
@@ -127,6 +139,12 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'api.UserMaster'
 
+# Password hashing runs on a bounded thread pool (socialnetwork/hashing.py).
+# Requests beyond workers + queue get a 503 instead of queueing behind the CPU; 0 workers hashes inline.
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+PASSWORD_HASHING_MAX_QUEUE = 64
+PASSWORD_HASHING_TIMEOUT = 10
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -147,13 +165,62 @@ STATIC_URL = "static/"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'socialnetwork.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.AllowAny'
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'socialnetwork.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'EXCEPTION_HANDLER': 'socialnetwork.responses.social_network_exception_handler',
+    'DEFAULT_THROTTLE_RATES': {
+        'friend_requests': '3/min',
+        'login': '10/min',
+        'signup': '5/min',
+        'user_search': '60/min',
+        'export': '10/hour',
+    },
+}
+
+# Pending friend requests older than this are moved to "expired" by expire_friend_requests
+FRIEND_REQUEST_EXPIRY_DAYS = 30
+
+# Answered friend requests older than this are moved to friend_requests_archive by archive_friend_requests
+FRIEND_REQUEST_ARCHIVE_DAYS = 90
+
+# Degrees of separation on profiles (api/friends/paths.py): longest path searched, largest frontier
+# (users) and most friendship rows loaded in one hop before giving up, and seconds a result stays cached.
+# Changes of either user invalidate it at once; the timeout bounds how stale paths through others get
+CONNECTION_MAX_DEPTH = 3
+CONNECTION_MAX_FRONTIER = 10_000
+CONNECTION_MAX_EDGES = 20_000
+CONNECTION_CACHE_TIMEOUT = 5 * 60
+
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Seconds a fully loaded user is kept in the in-process cache used by StatelessJWTAuthentication
+AUTH_USER_CACHE_TTL = 30
+
+# Sliding window rate limits live in Redis; socialnetwork.throttles.LocalMemoryThrottleBackend is for tests
+SOCIALNETWORK_THROTTLE_BACKEND = 'socialnetwork.throttles.RedisThrottleBackend'
+
+# Friend request events pushed on /ws/notifications/ (socialnetwork/websockets.py) go through Redis pub/sub so
+# every ASGI process sees them; socialnetwork.pubsub.LocalMemoryPubSub is for tests and single-process setups
+SOCIALNETWORK_PUBSUB_BACKEND = 'socialnetwork.pubsub.RedisPubSub'
+
+# Events queued for one WebSocket connection before it is closed as too slow
+NOTIFICATION_QUEUE_SIZE = 100
+
+REST_FRAMEWORK_EXTENSIONS = {
+    # Cached list responses are invalidated through per-user generations (socialnetwork/cache.py),
+    # so they can be kept for a day instead of relying on short expiry.
+    'DEFAULT_CACHE_RESPONSE_TIMEOUT': 60 * 60 * 24,
 }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class LocalMemoryThrottleBackend:
+    """
+    In-process sliding window log. Only suitable for tests and single-process setups
+    because every worker keeps its own counters.
+    """
+
+    def __init__(self):
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """ Records a hit and returns None, or the seconds to wait when the limit is reached """
+        now = time.monotonic()
+        with self._lock:
+            history = self._hits.setdefault(key, deque())
+            while history and history[0] <= now - window:
+                history.popleft()
+            if len(history) >= limit:
+                return history[0] + window - now
+            history.append(now)
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+class RedisThrottleBackend:
+    """
+    Sliding window log stored as a Redis sorted set. The whole check-and-record step runs
+    as one Lua script, so it is a single round trip and is atomic across workers.
+    """
+
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+    if redis.call('ZCARD', KEYS[1]) >= limit then
+        local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+        return math.max(tonumber(oldest[2]) + window - now, 1)
+    end
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return 0
+    """
+
+    def __init__(self, alias="default"):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection(alias)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, window):
+        now_ms = int(time.time() * 1000)
+        wait_ms = self.script(keys=[key], args=[now_ms, int(window * 1000), limit, uuid.uuid4().hex])
+        if wait_ms:
+            return wait_ms / 1000.0
+        return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_throttle_backend():
+    """ Returns the backend configured in SOCIALNETWORK_THROTTLE_BACKEND """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, "SOCIALNETWORK_THROTTLE_BACKEND", "socialnetwork.throttles.RedisThrottleBackend")
+                _backend = import_string(path)()
+    return _backend
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Rate limit keyed by user (or client IP for anonymous requests), using the
+    ``DEFAULT_THROTTLE_RATES`` entry of ``scope``, e.g. ``'3/min'``.
+    Rejected requests are answered from the throttle backend without touching the database.
+    """
+    scope = None
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self._wait = None
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return None, None
+        num, period = rate.split('/')
+        return int(num), self.durations[period[0]]
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return "throttle:%s:%s" % (self.scope, ident)
+
+    def applies_to(self, request, view):
+        return True
+
+    def allow_request(self, request, view):
+        if self.rate is None or not self.applies_to(request, view):
+            return True
+        return self.consume(self.get_cache_key(request, view))
+
+    def consume(self, key):
+        """ Takes one slot from the window of ``key``; returns False when none is left """
+        if self.rate is None:
+            return True
+        self._wait = get_throttle_backend().hit(key, self.num_requests, self.duration)
+        return self._wait is None
+
+    def wait(self):
+        if self._wait is None:
+            return None
+        return math.ceil(self._wait)
+
+
+class FriendRequestThrottle(SlidingWindowThrottle):
+    scope = 'friend_requests'
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+
+
+class SignUpThrottle(SlidingWindowThrottle):
+    scope = 'signup'
+
+
+class ExportThrottle(SlidingWindowThrottle):
+    scope = 'export'
+
+
+class UserSearchThrottle(SlidingWindowThrottle):
+    scope = 'user_search'
+
+    def applies_to(self, request, view):
+        # Plain listing is cheap, only searches are limited
+        return bool(request.query_params.get('search'))
@@ -3,25 +3,34 @@ import jwt
 import uuid
 from django.conf import settings
 
+ALGORITHM = 'HS256'
+ACCESS_TOKEN_LIFETIME = datetime.timedelta(minutes=15)
+REFRESH_TOKEN_LIFETIME = datetime.timedelta(days=7)
 
-def get_access_token(user):
+
+def issue_token(user, token_type, lifetime):
+    """
+    Single place where tokens are signed. The claims carry everything the permission classes
+    need (``role``) so authenticated requests don't have to load the user.
+    """
     payload = {
         'user_id': user.id,
         "name":user.name,
-        'token_type': 'access',
-        'exp': datetime.datetime.now() + datetime.timedelta(minutes=15),
-        'jti': str(uuid.uuid4()).replace("-","")}
-    access_token = jwt.encode(payload,settings.SECRET_KEY, algorithm='HS256')
-    return access_token
+        "role":user.role,
+        'token_type': token_type,
+        'exp': datetime.datetime.now(tz=datetime.timezone.utc) + lifetime,
+        'jti': uuid.uuid4().hex}
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=ALGORITHM)
+
 
+def decode_token(token):
+    """ Verifies the signature and expiry of a token and returns its claims """
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+
+
+def get_access_token(user):
+    return issue_token(user, 'access', ACCESS_TOKEN_LIFETIME)
 
 
 def get_refresh_token(user):
-    payload = {
-        'user_id': user.id,
-        "name":user.name,
-        'token_type': 'refresh',
-        'exp': datetime.datetime.now() + datetime.timedelta(days=7),
-        'jti': str(uuid.uuid4()).replace("-","")}
-    refresh_token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
-    return refresh_token
\ No newline at end of file
+    return issue_token(user, 'refresh', REFRESH_TOKEN_LIFETIME)
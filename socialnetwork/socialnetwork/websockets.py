@@ -0,0 +1,93 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+import jwt
+from socialnetwork.pubsub import get_pubsub
+from socialnetwork.tokens import decode_token
+
+NOTIFICATIONS_PATH = "/ws/notifications/"
+
+# Close codes sent before the handshake completes (rejects it) or afterwards
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401  # Also sent when the access token expires: the client reconnects with a fresh one
+CLOSE_TOO_SLOW = 1013  # "Try again later": the client reconnects and resyncs over REST
+
+
+def authenticate(scope):
+    """
+    Claims of the access token in the ``Authorization: Bearer`` header, or in the ``token``
+    query parameter for browsers, which cannot set headers on WebSockets. None when invalid.
+    """
+    token = None
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            parts = value.split()
+            if len(parts) == 2 and parts[0].lower() == b"bearer":
+                token = parts[1].decode("latin-1")
+    if token is None:
+        token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token", [None])[0]
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except jwt.InvalidTokenError:
+        return None
+    if claims.get("token_type") != "access" or "user_id" not in claims:
+        return None
+    return claims
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ``/ws/notifications/``: pushes the friend request events published with
+    ``socialnetwork.pubsub.publish_event`` to the connected user as JSON text frames, e.g.
+    ``{"type": "friend_request.received", "request_id": 12, "user": {"id": 3, "name": "..."}}``.
+    Types are friend_request.received, .accepted, .rejected and .cancelled; ``user`` is who acted
+    and ``request_id`` is null for requests sent in bulk. Messages from the client are ignored.
+    The connection is closed with 4401 when the access token it was opened with expires.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+    if scope["path"] != NOTIFICATIONS_PATH:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    claims = authenticate(scope)
+    if claims is None:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+
+    pubsub = get_pubsub()
+    subscription = pubsub.subscribe(claims["user_id"])
+    try:
+        await send({"type": "websocket.accept"})
+        # One task waits for the client to go away, one forwards events until then and one
+        # closes the connection once the token expires
+        tasks = [asyncio.ensure_future(_wait_for_disconnect(receive)), asyncio.ensure_future(_forward(subscription, send))]
+        if "exp" in claims:
+            tasks.append(asyncio.ensure_future(_expire(claims["exp"], send)))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        pubsub.unsubscribe(subscription)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _forward(subscription, send):
+    while True:
+        message = await subscription.get()
+        if message is None:
+            await send({"type": "websocket.close", "code": CLOSE_TOO_SLOW})
+            return
+        await send({"type": "websocket.send", "text": message})
+
+
+async def _expire(exp, send):
+    await asyncio.sleep(max(0, exp - time.time()))
+    await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})